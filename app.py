@@ -1,10 +1,31 @@
 import os
-from flask import Flask, render_template, redirect, url_for, flash, request, session, jsonify
+import json
+import click
+from flask import Flask, render_template, redirect, url_for, flash, request, session, jsonify, Response, stream_with_context, abort
 from flask_login import LoginManager, login_user, current_user, logout_user, login_required
 from functools import wraps
-from models import db, Admin, Doctor, Patient, Department, Appointment, Treatment, DoctorAvailability
+from models import db, Doctor, Patient, Appointment, Treatment, DoctorAvailability
 from forms import (RegistrationForm, LoginForm, AddDoctorForm, TreatmentForm,
                    BookAppointmentForm, AvailabilityForm)
+from slot_calendar import init_calendar, get_available_slots, department_slots, month_slots, refresh_calendar, lookup_limit
+import queries
+from exports import EXPORTS, FORMATS, stream_export
+from bulk import data_cli, import_stream, spool_upload
+from migrations import setup_database, check_query_plans, UpgradeError
+from stats import init_stats, get_stats
+from identity import init_identity, authenticate, load_identity, disable_account
+from passwords import init_passwords
+from database import load_database_config, init_database
+from instrumentation import init_instrumentation
+from search import init_search, rebuild_search_index, search_page
+from booking import book_slot
+from http_cache import init_http_cache, cached_json, bump_versions
+from reference import init_reference, get_reference
+from jobs import init_jobs
+from notifications import init_notifications, appointment_cancelled, account_removed
+from archive import archive_appointments
+from reports import init_reports, rebuild_rollups, daily_appointments, rates, occupancy
+from sqlalchemy.exc import IntegrityError, OperationalError
 from datetime import datetime, date, time, timedelta
 
 
@@ -23,7 +44,7 @@ admin_required = role_required('admin')
 doctor_required = role_required('doctor')
 patient_required = role_required('patient')
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__, instance_relative_config=True)
 
     # Ensure instance folder exists
@@ -33,35 +54,130 @@ def create_app():
         pass
 
     app.config['SECRET_KEY'] = 'a-very-secret-key-that-is-long-and-secure'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hospital.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-    db.init_app(app)
+    app.config['SLOT_MINUTES'] = 30
+    app.config['SLOT_CALENDAR_DAYS'] = 60
+    app.config['SLOT_LOOKUP_DAYS'] = 365
+    app.config['ADMIN_PAGE_SIZE'] = 50
+    app.config['STATS_TTL'] = 300
+    app.config['REFERENCE_CACHE_TTL'] = 300
+    app.config['BOOKING_RETRIES'] = 5
+    app.config['BOOKING_RETRY_BACKOFF'] = 0.05
+    app.config['IDENTITY_CACHE_TTL'] = 60
+    app.config['PASSWORD_HASH_METHOD'] = 'scrypt:32768:8:1'
+    app.config['PASSWORD_HASH_WORKERS'] = 4
+    app.config['SLOW_QUERY_MS'] = 200
+    app.config['SEARCH_BACKEND'] = 'auto'
+    app.config['IMPORT_BATCH_SIZE'] = 500
+    app.config['IMPORT_HASH_PROCESSES'] = None
+    app.config['API_CACHE_SIZE'] = 1024
+    app.config['API_CACHE_TTL'] = 60
+    app.config['API_DOCTORS_CACHE_TTL'] = 3600
+    app.config['API_DOCTORS_MAX_AGE'] = 300
+    app.config['JOB_WORKERS'] = 2
+    app.config['JOB_POLL_INTERVAL'] = 5
+    app.config['JOB_VISIBILITY_TIMEOUT'] = 300
+    app.config['JOB_MAX_ATTEMPTS'] = 5
+    app.config['JOB_RETRY_BACKOFF'] = 30
+    app.config['JOB_DELETE_BATCH'] = 200
+    app.config['JOB_RETENTION_DAYS'] = 7
+    app.config['JOB_PURGE_INTERVAL'] = 3600
+    app.config['ARCHIVE_AFTER_DAYS'] = 365
+    app.config['ARCHIVE_BATCH_SIZE'] = 1000
+    if test_config:
+        app.config.update(test_config)
+    # Database URL, pool sizing and SQLite pragmas come from the environment (see database.py)
+    load_database_config(app.config)
+
+    init_database(app)
+    metrics = init_instrumentation(app)
+    init_stats(app)
+    init_identity(app)
+    init_passwords(app)
+    init_search(app)
+    init_calendar(app)
+    init_http_cache(app)
+    init_reference(app)
+    init_reports(app)
+    init_notifications(app)
+    job_queue = init_jobs(app)
     login_manager = LoginManager()
     login_manager.login_view = 'login'
     login_manager.init_app(app)
 
     @login_manager.user_loader
     def load_user(user_id):
-        role = session.get('role')
-        user_id = int(user_id)
-        if role == 'admin': return Admin.query.get(user_id)
-        elif role == 'doctor': return Doctor.query.get(user_id)
-        elif role == 'patient': return Patient.query.get(user_id)
-        return None
+        return load_identity(session.get('role'), int(user_id))
 
-    with app.app_context():
-        db.create_all()
-        # Seed initial data if tables are empty
-        if not Admin.query.filter_by(username='admin').first():
-            admin_user = Admin(username='admin')
-            admin_user.set_password('admin123')
-            db.session.add(admin_user)
-        if Department.query.count() == 0:
-            departments = ['Cardiology', 'Neurology', 'Oncology', 'Pediatrics', 'Orthopedics', 'Dermatology']
-            for dept_name in departments:
-                db.session.add(Department(name=dept_name))
-        db.session.commit()
+    # No database I/O here: schema and seed data come from `flask init-db`, the
+    # reference cache loads on first use and job workers start with the first request
+    @app.before_request
+    def start_job_workers():
+        job_queue.start_once()
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the schema and seed the default admin and departments; safe to re-run."""
+        try:
+            setup_database()
+        except UpgradeError as e:
+            raise click.ClickException(str(e))
+        click.echo('Database ready.')
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db_command():
+        """Create missing tables and indexes on an existing database."""
+        try:
+            created = setup_database(seed=False)
+        except UpgradeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'Created indexes: {", ".join(created)}' if created else 'All indexes already present.')
+
+    app.cli.add_command(data_cli)
+
+    @app.cli.command('run-jobs')
+    @click.option('--once', is_flag=True, help='Run the jobs that are due and exit.')
+    def run_jobs_command(once):
+        """Process background jobs in the foreground (for deployments with JOB_WORKERS = 0)."""
+        job_queue.stop()
+        if once:
+            click.echo(f'Ran {job_queue.run_pending()} jobs.')
+            return
+        job_queue.workers = job_queue.workers or 1
+        job_queue.start()
+        job_queue.join()
+
+    @app.cli.command('archive-appointments')
+    @click.option('--days', type=int, help='Archive finished appointments older than this (ARCHIVE_AFTER_DAYS).')
+    @click.option('--batch-size', type=int, help='Appointments moved per commit (ARCHIVE_BATCH_SIZE).')
+    def archive_appointments_command(days, batch_size):
+        """Move old completed and cancelled appointments and their treatments to the archive tables."""
+        click.echo(f'Archived {archive_appointments(days, batch_size)} appointments.')
+
+    @app.cli.command('rebuild-reports')
+    @click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First day to recompute (default: all).')
+    @click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Last day to recompute (default: all).')
+    def rebuild_reports_command(start, end):
+        """Recompute the daily report rollups from appointments."""
+        rows = rebuild_rollups(start and start.date(), end and end.date())
+        click.echo(f'Rebuilt {rows} daily rollup rows.')
+
+    @app.cli.command('rebuild-search')
+    def rebuild_search_command():
+        """Rebuild the doctor/patient search index from scratch."""
+        rebuild_search_index()
+        click.echo('Search index rebuilt.')
+
+    @app.cli.command('check-indexes')
+    def check_indexes_command():
+        """EXPLAIN the hot queries and fail if any of them falls back to a full table scan."""
+        report = check_query_plans()
+        for name, plan, uses_index in report:
+            click.echo(f'[{"ok" if uses_index else "SCAN"}] {name}')
+            for line in plan:
+                click.echo(f'      {line}')
+        if not all(uses_index for _, _, uses_index in report):
+            raise SystemExit(1)
 
   
     @app.route('/')
@@ -87,24 +203,11 @@ def create_app():
         if current_user.is_authenticated: return redirect(url_for('index'))
         form = LoginForm()
         if form.validate_on_submit():
-            user = None
-            role = None
-            admin = Admin.query.filter_by(username=form.email.data).first()
-            if admin and admin.check_password(form.password.data):
-                user, role, redirect_url = admin, 'admin', url_for('admin_dashboard')
-            else:
-                doctor = Doctor.query.filter_by(email=form.email.data).first()
-                if doctor and doctor.check_password(form.password.data):
-                    user, role, redirect_url = doctor, 'doctor', url_for('doctor_dashboard')
-                else:
-                    patient = Patient.query.filter_by(email=form.email.data).first()
-                    if patient and patient.check_password(form.password.data):
-                        user, role, redirect_url = patient, 'patient', url_for('patient_dashboard')
-
+            user, role = authenticate(form.email.data, form.password.data)
             if user:
                 login_user(user)
                 session['role'] = role
-                return redirect(redirect_url)
+                return redirect(url_for(f'{role}_dashboard'))
             else:
                 flash('Login Unsuccessful. Please check email and password.', 'danger')
         return render_template('login.html', title='Login', form=form)
@@ -120,11 +223,7 @@ def create_app():
     @login_required
     @admin_required
     def admin_dashboard():
-        stats = {
-            'doctors': Doctor.query.count(),
-            'patients': Patient.query.count(),
-            'appointments': Appointment.query.count()
-        }
+        stats = get_stats().snapshot()
         return render_template('admin/admin_dashboard.html', stats=stats)
 
     @app.route('/admin/add_doctor', methods=['GET', 'POST'])
@@ -133,7 +232,7 @@ def create_app():
     def add_doctor():
         form = AddDoctorForm()
         if form.validate_on_submit():
-            doctor = Doctor(name=form.name.data, email=form.email.data, phone=form.phone.data, department=form.specialization.data)
+            doctor = Doctor(name=form.name.data, email=form.email.data, phone=form.phone.data, specialization_id=form.specialization.data)
             doctor.set_password(form.password.data)
             db.session.add(doctor)
             db.session.commit()
@@ -146,25 +245,62 @@ def create_app():
     @admin_required
     def view_doctors():
         query = request.args.get('query', '')
-        q_filter = Doctor.name.contains(query) | Department.name.contains(query) if query else True
-        doctors = Doctor.query.join(Department).filter(q_filter).all()
-        return render_template('admin/view_doctors.html', doctors=doctors, query=query)
+        after = request.args.get('after', type=int)
+        if query:
+            page = search_page('doctor', query, after, app.config['ADMIN_PAGE_SIZE'])
+        else:
+            page = queries.doctor_page(after=after, per_page=app.config['ADMIN_PAGE_SIZE'])
+        return render_template('admin/view_doctors.html', doctors=page.items, next_cursor=page.next_cursor, query=query)
  
     @app.route('/admin/view_patients')
     @login_required
     @admin_required
     def view_patients():
         query = request.args.get('query', '')
-        q_filter = Patient.name.contains(query) | Patient.id.like(f'%{query}%') | Patient.phone.contains(query) if query else True
-        patients = Patient.query.filter(q_filter).all()
-        return render_template('admin/view_patients.html', patients=patients, query=query)
+        after = request.args.get('after', type=int)
+        if query:
+            page = search_page('patient', query, after, app.config['ADMIN_PAGE_SIZE'])
+        else:
+            page = queries.patient_page(after=after, per_page=app.config['ADMIN_PAGE_SIZE'])
+        return render_template('admin/view_patients.html', patients=page.items, next_cursor=page.next_cursor, query=query)
 
     @app.route('/admin/view_appointments')
     @login_required
     @admin_required
     def view_appointments():
-        appointments = Appointment.query.order_by(Appointment.appointment_datetime.desc()).all()
-        return render_template('admin/view_appointments.html', appointments=appointments)
+        page = queries.appointment_page(request.args.get('after'), app.config['ADMIN_PAGE_SIZE'])
+        return render_template('admin/view_appointments.html', appointments=page.items, next_cursor=page.next_cursor)
+
+    @app.route('/admin/export/<kind>.<fmt>')
+    @login_required
+    @admin_required
+    def export_data(kind, fmt):
+        if kind not in EXPORTS or fmt not in FORMATS: abort(404)
+        return Response(stream_with_context(stream_export(kind, fmt)), mimetype=FORMATS[fmt],
+                        headers={'Content-Disposition': f'attachment; filename={kind}.{fmt}'})
+
+    @app.route('/admin/import/<kind>', methods=['POST'])
+    @login_required
+    @admin_required
+    def import_data(kind):
+        upload = request.files.get('file')
+        if kind not in EXPORTS or upload is None: abort(400)
+        fmt = request.form.get('format') or ('jsonl' if upload.filename.endswith(('.jsonl', '.ndjson')) else 'csv')
+        source = spool_upload(upload)
+
+        # Rejected rows are streamed back as they are found, then a summary line
+        def report():
+            errors = import_stream(kind, source, fmt)
+            rejected = 0
+            while True:
+                try:
+                    line_no, message = next(errors)
+                except StopIteration as done:
+                    yield json.dumps({'inserted': done.value, 'rejected': rejected}) + '\n'
+                    return
+                rejected += 1
+                yield json.dumps({'line': line_no, 'error': message}) + '\n'
+        return Response(stream_with_context(report()), mimetype=FORMATS['jsonl'])
 
     @app.route('/admin/remove/<user_type>/<int:user_id>', methods=['POST'])
     @login_required
@@ -172,9 +308,17 @@ def create_app():
     def remove_user(user_type, user_id):
         Model = Doctor if user_type == 'doctor' else Patient
         user = Model.query.get_or_404(user_id)
-        db.session.delete(user)
+        role = 'doctor' if Model is Doctor else 'patient'
+        # The login goes now; appointments, treatments and the account itself are
+        # deleted in batches by a background job, queued once per account
+        if disable_account(role, user.id):
+            account_removed(role, user.id)
+            if role == 'doctor':
+                bump_versions('doctors')
         db.session.commit()
-        flash(f'{user_type.title()} {user.name} has been removed.', 'success')
+        if role == 'doctor':
+            get_reference().invalidate()
+        flash(f'{user_type.title()} {user.name} is being removed.', 'success')
         return redirect(url_for(f'view_{user_type}s'))
 
     # ======================== DOCTOR ROUTES ========================
@@ -182,10 +326,7 @@ def create_app():
     @login_required
     @doctor_required
     def doctor_dashboard():
-        today = date.today()
-        appointments = Appointment.query.filter_by(doctor_id=current_user.id)\
-            .filter(db.func.date(Appointment.appointment_datetime) == today)\
-            .order_by(Appointment.appointment_datetime).all()
+        appointments = queries.doctor_day_appointments(current_user.id, date.today()).all()
         return render_template('doctor/doctor_dashboard.html', appointments=appointments)
 
     @app.route('/doctor/appointment/<int:appointment_id>/update_status', methods=['POST'])
@@ -196,8 +337,15 @@ def create_app():
         if appointment.doctor_id != current_user.id:
             flash('You do not have permission to modify this appointment.', 'danger')
             return redirect(url_for('doctor_dashboard'))
+        if request.form.get('status') == 'Cancelled' and appointment.status != 'Cancelled':
+            appointment_cancelled(appointment, by='doctor')
         appointment.status = request.form.get('status')
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('That time slot has been booked by another patient since this appointment was cancelled.', 'danger')
+            return redirect(url_for('doctor_dashboard'))
         flash(f'Appointment status updated to {appointment.status}.', 'success')
         return redirect(url_for('doctor_dashboard'))
 
@@ -223,8 +371,7 @@ def create_app():
     @doctor_required
     def view_patient_history(patient_id):
         patient = Patient.query.get_or_404(patient_id)
-        appointments = Appointment.query.filter_by(patient_id=patient.id, doctor_id=current_user.id)\
-            .order_by(Appointment.appointment_datetime.desc()).all()
+        appointments = queries.full_doctor_patient_history(patient.id, current_user.id)
         return render_template('doctor/view_patient_history.html', patient=patient, appointments=appointments)
 
     @app.route('/doctor/availability', methods=['GET', 'POST'])
@@ -240,6 +387,7 @@ def create_app():
             availability.end_time = form.end_time.data
             db.session.add(availability)
             db.session.commit()
+            refresh_calendar(current_user.id)
             flash(f'Availability for {form.day.data} updated.', 'success')
             return redirect(url_for('manage_availability'))
 
@@ -251,7 +399,7 @@ def create_app():
     @login_required
     @patient_required
     def patient_dashboard():
-        upcoming_appointments = Appointment.query.filter(Appointment.patient_id == current_user.id, Appointment.appointment_datetime >= datetime.now()).order_by(Appointment.appointment_datetime).all()
+        upcoming_appointments = queries.patient_upcoming(current_user.id).all()
         return render_template('patient/patient_dashboard.html', appointments=upcoming_appointments)
 
     @app.route('/patient/book_appointment', methods=['GET', 'POST'])
@@ -261,8 +409,7 @@ def create_app():
         form = BookAppointmentForm()
         if request.method == 'POST':
             # Manually set choices for validation
-            # ***FIXED HERE***
-            form.doctor.choices = [(d.id, d.name) for d in Doctor.query.filter_by(specialization_id=form.department.data.id).all()]
+            form.doctor.choices = form.doctor_choices()
             form.appointment_time.choices = [t for t in get_available_slots(form.doctor.data, form.appointment_date.data)]
 
             if form.validate_on_submit():
@@ -272,15 +419,15 @@ def create_app():
                 hour, minute = map(int, time_str.split(':'))
                 appointment_datetime = datetime.combine(date, time(hour, minute))
 
-                # Final check for conflict prevention
-                existing_appointment = Appointment.query.filter_by(doctor_id=doctor_id, appointment_datetime=appointment_datetime).first()
-                if existing_appointment:
-                    flash('This time slot has just been booked. Please select another time.', 'danger')
+                # The unique index on active slots is the final conflict check
+                try:
+                    appointment = book_slot(current_user.id, doctor_id, appointment_datetime)
+                except OperationalError:
+                    flash('The booking system is busy right now. Please try again in a moment.', 'warning')
+                    return redirect(url_for('book_appointment'))
+                if appointment is None:
+                    flash('This time slot is no longer available. Please select another time.', 'danger')
                     return redirect(url_for('book_appointment'))
-
-                appointment = Appointment(patient_id=current_user.id, doctor_id=doctor_id, appointment_datetime=appointment_datetime, status='Booked')
-                db.session.add(appointment)
-                db.session.commit()
                 flash('Appointment booked successfully!', 'success')
                 return redirect(url_for('patient_dashboard'))
         return render_template('patient/book_appointment.html', form=form)
@@ -292,6 +439,8 @@ def create_app():
         appointment = Appointment.query.get_or_404(appointment_id)
         if appointment.patient_id != current_user.id:
             return redirect(url_for('patient_dashboard'))
+        if appointment.status != 'Cancelled':
+            appointment_cancelled(appointment, by='patient')
         appointment.status = 'Cancelled'
         db.session.commit()
         flash('Appointment cancelled.', 'info')
@@ -301,67 +450,109 @@ def create_app():
     @login_required
     @patient_required
     def view_history():
-        appointments = Appointment.query.filter_by(patient_id=current_user.id)\
-            .order_by(Appointment.appointment_datetime.desc()).all()
+        appointments = queries.full_patient_history(current_user.id)
         return render_template('patient/view_history.html', appointments=appointments)
 
     # ======================== API & DYNAMIC CONTENT ROUTES ========================
+    def beyond_lookup_limit(day):
+        if day > lookup_limit():
+            return jsonify({'error': f'Slots can only be looked up {app.config["SLOT_LOOKUP_DAYS"]} days ahead'}), 400
+        return None
+
     @app.route('/api/doctors_by_department/<int:dept_id>')
+    @cached_json('API_DOCTORS_CACHE_TTL', 'API_DOCTORS_MAX_AGE', depends=lambda dept_id: ('doctors',))
     def doctors_by_department(dept_id):
-        # ***FIXED HERE***
-        doctors = Doctor.query.filter_by(specialization_id=dept_id).all()
-        return jsonify([{'id': d.id, 'name': d.name} for d in doctors])
+        return jsonify([{'id': doctor_id, 'name': name} for doctor_id, name in get_reference().doctors(dept_id)])
 
     @app.route('/api/available_slots/<int:doctor_id>/<string:date_str>')
+    @cached_json('API_CACHE_TTL', depends=lambda doctor_id, date_str: (('availability', doctor_id), ('appointments', doctor_id)))
     def available_slots(doctor_id, date_str):
         try:
             selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
         except ValueError:
             return jsonify({'error': 'Invalid date format'}), 400
+        too_far = beyond_lookup_limit(selected_date)
+        if too_far:
+            return too_far
 
         slots = get_available_slots(doctor_id, selected_date)
         return jsonify(slots)
 
+    @app.route('/api/available_slots/<int:doctor_id>/month/<string:month_str>')
+    @cached_json('API_CACHE_TTL', depends=lambda doctor_id, month_str: (('availability', doctor_id), ('appointments', doctor_id)))
+    def available_slots_month(doctor_id, month_str):
+        try:
+            month = datetime.strptime(month_str, '%Y-%m').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid month format'}), 400
+        too_far = beyond_lookup_limit(month)
+        if too_far:
+            return too_far
+
+        return jsonify(month_slots(doctor_id, month.year, month.month))
+
+    @app.route('/api/available_slots/department/<int:dept_id>/<string:date_str>')
+    @cached_json('API_CACHE_TTL', depends=lambda dept_id, date_str: ('doctors', 'availability', 'appointments'))
+    def department_available_slots(dept_id, date_str):
+        try:
+            start_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format'}), 400
+        too_far = beyond_lookup_limit(start_date)
+        if too_far:
+            return too_far
+        days = min(max(request.args.get('days', 7, type=int), 1), 31)
+
+        return jsonify(department_slots(dept_id, start_date, days))
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
     @app.route('/api/chart_data/admin')
     @login_required
     @admin_required
     def admin_chart_data():
+        stats = get_stats().snapshot()
         data = {
             "labels": ["Doctors", "Patients", "Appointments"],
             "datasets": [{
                 "label": "Total Counts",
-                "data": [Doctor.query.count(), Patient.query.count(), Appointment.query.count()],
+                "data": [stats['doctors'], stats['patients'], stats['appointments']],
                 "backgroundColor": ["#0d6efd", "#198754", "#0dcaf0"]
-            }]
+            }],
+            "by_status": stats['by_status'],
+            "by_department": stats['by_department']
         }
         return jsonify(data)
 
-    # Helper function to get available time slots for a doctor on a specific date
-    def get_available_slots(doctor_id, selected_date):
-        day_name = selected_date.strftime('%A')
-        availability = DoctorAvailability.query.filter_by(doctor_id=doctor_id, day_of_week=day_name).first()
-        if not availability: return []
-
-        booked_slots = [a.appointment_datetime.time() for a in Appointment.query.filter(
-            Appointment.doctor_id == doctor_id,
-            db.func.date(Appointment.appointment_datetime) == selected_date,
-            Appointment.status != 'Cancelled'
-        ).all()]
-
-        available_slots = []
-        current_time = datetime.combine(selected_date, availability.start_time)
-        end_time = datetime.combine(selected_date, availability.end_time)
-
-        while current_time < end_time:
-            if current_time.time() not in booked_slots:
-                if datetime.combine(selected_date, current_time.time()) > datetime.now(): # Check if slot is in the future
-                    available_slots.append(current_time.strftime('%H:%M'))
-            current_time += timedelta(minutes=30) # Assuming 30-minute slots
+    def report_request():
+        # Date range (default: the last 30 days) and grouping shared by the report endpoints
+        try:
+            end = date.fromisoformat(request.args['end']) if request.args.get('end') else date.today()
+            start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=29)
+        except ValueError:
+            abort(400, 'start and end must be YYYY-MM-DD')
+        group = request.args.get('group', 'doctor')
+        if start > end or group not in ('doctor', 'department'):
+            abort(400, 'start must not be after end, and group must be doctor or department')
+        return start, end, group
 
-        return available_slots
+    @app.route('/api/reports/<string:report>')
+    @login_required
+    @admin_required
+    def admin_report(report):
+        builders = {'appointments': daily_appointments, 'rates': rates, 'occupancy': occupancy}
+        if report not in builders:
+            abort(404)
+        start, end, group = report_request()
+        return jsonify({'start': start.isoformat(), 'end': end.isoformat(), 'group': group,
+                        'rows': builders[report](start, end, group)})
 
     return app
 
 if __name__ == '__main__':
     app = create_app()
+    with app.app_context():
+        setup_database()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, delete, select, literal
+from models import db, Appointment, Treatment, ArchivedAppointment, ArchivedTreatment
+
+# Completed and cancelled appointments older than ARCHIVE_AFTER_DAYS move, with
+# their treatments, to the archived_* tables in the same database. The hot
+# tables and their indexes then only hold recent and upcoming visits; the
+# history views and exports read both (see queries.py). Archived rows keep
+# their ids, which is why appointment ids are never reused (models.py).
+ARCHIVED_STATUSES = ('Completed', 'Cancelled')
+
+
+def archive_appointments(older_than_days=None, batch_size=None, now=None):
+    """Move finished appointments older than the horizon in batches, one commit per batch; returns how many moved."""
+    if older_than_days is None:
+        older_than_days = current_app.config.get('ARCHIVE_AFTER_DAYS', 365)
+    batch_size = batch_size or current_app.config.get('ARCHIVE_BATCH_SIZE', 1000)
+    cutoff = (now or datetime.now()) - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        ids = list(db.session.scalars(
+            select(Appointment.id)
+            .where(Appointment.appointment_datetime < cutoff, Appointment.status.in_(ARCHIVED_STATUSES))
+            .order_by(Appointment.appointment_datetime, Appointment.id)
+            .limit(batch_size)))
+        if not ids:
+            break
+        db.session.execute(insert(ArchivedAppointment).from_select(
+            ['id', 'patient_id', 'doctor_id', 'appointment_datetime', 'status', 'archived_at'],
+            select(Appointment.id, Appointment.patient_id, Appointment.doctor_id, Appointment.appointment_datetime,
+                   Appointment.status, literal(datetime.now(), db.DateTime))
+            .where(Appointment.id.in_(ids))))
+        db.session.execute(insert(ArchivedTreatment).from_select(
+            ['appointment_id', 'diagnosis', 'prescription'],
+            select(Treatment.appointment_id, Treatment.diagnosis, Treatment.prescription)
+            .where(Treatment.appointment_id.in_(ids))))
+        for statement in (delete(Treatment).where(Treatment.appointment_id.in_(ids)),
+                          delete(Appointment).where(Appointment.id.in_(ids))):
+            db.session.execute(statement, execution_options={'synchronize_session': False})
+        db.session.commit()
+        moved += len(ids)
+    return moved
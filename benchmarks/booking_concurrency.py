@@ -0,0 +1,68 @@
+"""Fire many simultaneous bookings at one doctor/time slot.
+
+    python -m benchmarks.booking_concurrency --attempts 300 --threads 32
+
+Exactly one attempt must succeed; the rest should come back as "slot taken".
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import create_app
+from migrations import setup_database
+from booking import book_slot
+from models import db, Doctor, Patient, Department, Appointment
+
+
+def seed(app, patients):
+    with app.app_context():
+        setup_database()
+        doctor = Doctor(name='Bench Doctor', email='bench.doctor@example.com', phone='0000000000',
+                        department=Department.query.first(), password_hash='x')
+        db.session.add(doctor)
+        db.session.add_all([Patient(name=f'Patient {i}', email=f'patient{i}@example.com', phone='0000000000',
+                                    password_hash='x') for i in range(patients)])
+        db.session.commit()
+        return doctor.id, [p.id for p in Patient.query.order_by(Patient.id)]
+
+
+def run(attempts, threads):
+    workdir = tempfile.mkdtemp()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'bench.db')})
+    doctor_id, patient_ids = seed(app, attempts)
+    slot = (datetime.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+    start_gate = threading.Barrier(threads)
+
+    def attempt(i):
+        if i < threads:
+            start_gate.wait()
+        with app.app_context():
+            try:
+                return 'booked' if book_slot(patient_ids[i], doctor_id, slot) else 'taken'
+            except Exception as e:
+                return type(e).__name__
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = list(pool.map(attempt, range(attempts)))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        active = Appointment.query.filter(Appointment.doctor_id == doctor_id, Appointment.appointment_datetime == slot,
+                                          Appointment.status != 'Cancelled').count()
+    summary = {outcome: outcomes.count(outcome) for outcome in set(outcomes)}
+    print(f'attempts={attempts} threads={threads} elapsed={elapsed:.3f}s throughput={attempts / elapsed:.0f} attempts/s')
+    print(f'outcomes={summary} active rows for slot={active}')
+    return summary.get('booked', 0) == 1 and active == 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--attempts', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+    raise SystemExit(0 if run(args.attempts, args.threads) else 1)
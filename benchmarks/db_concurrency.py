@@ -0,0 +1,95 @@
+"""Mixed read/write load against SQLite in rollback-journal and WAL mode.
+
+    python -m benchmarks.db_concurrency --seconds 5 --readers 8 --writers 4
+
+Readers run the slot-engine queries, writers book distinct slots. Compare the
+ops/s and lock errors between journal modes, or point DATABASE_URL at a server
+database to run the same workload against it.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from migrations import setup_database
+from booking import book_slot
+from models import db, Doctor, Patient, Department, DoctorAvailability
+from slots import compute_slots
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def seed(app, doctors):
+    with app.app_context():
+        setup_database()
+        department = Department.query.first()
+        db.session.add_all([Doctor(name=f'Doctor {i}', email=f'doctor{i}@example.com', phone='0000000000',
+                                   department=department, password_hash='x') for i in range(doctors)])
+        db.session.add(Patient(name='Bench Patient', email='patient@example.com', phone='0000000000', password_hash='x'))
+        db.session.flush()
+        for doctor in Doctor.query:
+            db.session.add_all([DoctorAvailability(doctor_id=doctor.id, day_of_week=day) for day in DAYS])
+        db.session.commit()
+        return [d.id for d in Doctor.query], Patient.query.first().id
+
+
+def run(journal_mode, seconds, readers, writers, doctors=20):
+    config = {'SQLITE_JOURNAL_MODE': journal_mode, 'BOOKING_RETRIES': 1}
+    if 'DATABASE_URL' not in os.environ:
+        config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(config)
+    doctor_ids, patient_id = seed(app, doctors)
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    def tally(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        with app.app_context():
+            while time.monotonic() < deadline:
+                try:
+                    compute_slots(doctor_ids, start.date(), start.date() + timedelta(days=6))
+                    tally('reads')
+                except OperationalError:
+                    db.session.rollback()
+                    tally('errors')
+
+    def writer(n):
+        with app.app_context():
+            i = 0
+            while time.monotonic() < deadline:
+                slot = start + timedelta(minutes=(i * writers + n))
+                i += 1
+                try:
+                    book_slot(patient_id, doctor_ids[i % len(doctor_ids)], slot)
+                    tally('writes')
+                except OperationalError:
+                    tally('errors')
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"{journal_mode:<8} reads/s={counts['reads'] / seconds:8.1f} writes/s={counts['writes'] / seconds:8.1f} "
+          f"lock errors={counts['errors']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    args = parser.parse_args()
+    for mode in ('DELETE', 'WAL'):
+        run(mode, args.seconds, args.readers, args.writers)
@@ -0,0 +1,118 @@
+"""Seed a synthetic hospital for benchmarks.
+
+    seed_hospital(doctors=20, patients=1000, years=1, seed=1)
+
+Everything is drawn from a seeded random generator relative to today, so the
+same arguments produce the same data. Rows go in with bulk inserts; the
+identity table, search index and caches are brought up to date afterwards.
+"""
+import random
+from datetime import date, datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from models import db, Department, Doctor, Patient, Appointment, Treatment, DoctorAvailability
+from identity import sync_identities
+from migrations import setup_database
+from search import ensure_search_index
+from slot_calendar import clear_calendar
+from reports import rebuild_rollups
+
+PASSWORD = 'bench-password'
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+FIRST = ['Asha', 'Ben', 'Chen', 'Dara', 'Elif', 'Farid', 'Gita', 'Hugo', 'Ines', 'Jomo', 'Kai', 'Lena']
+LAST = ['Okafor', 'Silva', 'Novak', 'Tanaka', 'Haddad', 'Larsen', 'Mehta', 'Quispe', 'Rossi', 'Walsh']
+CHUNK = 5000
+
+
+def _name(rng, i):
+    return f'{rng.choice(FIRST)} {rng.choice(LAST)} {i}'
+
+
+def _phone(rng):
+    return str(rng.randrange(10 ** 9, 10 ** 10))
+
+
+def _insert(Model, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(insert(Model), rows[start:start + CHUNK])
+
+
+def seed_hospital(departments=6, doctors=20, patients=1000, years=1, per_day=4, future_days=30, seed=1,
+                  hash_method='pbkdf2:sha256:1000'):
+    """Populate the current app's (empty) database; returns a summary of the row counts.
+
+    Every doctor and patient has the password `PASSWORD`. Appointments cover
+    `years` of history and `future_days` ahead, `per_day` per working day.
+    """
+    setup_database()
+    rng = random.Random(seed)
+    pwhash = generate_password_hash(PASSWORD, method=hash_method)
+    minutes = current_app.config.get('SLOT_MINUTES', 30)
+
+    existing = {d.name for d in Department.query}
+    _insert(Department, [{'name': f'Department {i}'} for i in range(len(existing), departments)])
+    dept_ids = [d.id for d in Department.query.order_by(Department.id)][:departments]
+
+    _insert(Doctor, [{'name': _name(rng, i), 'email': f'doctor{i}@example.com', 'phone': _phone(rng),
+                      'specialization_id': dept_ids[i % len(dept_ids)], 'password_hash': pwhash}
+                     for i in range(doctors)])
+    _insert(Patient, [{'name': _name(rng, i), 'email': f'patient{i}@example.com', 'phone': _phone(rng),
+                       'password_hash': pwhash} for i in range(patients)])
+    doctor_ids = [i for i, in db.session.query(Doctor.id).order_by(Doctor.id)]
+    patient_ids = [i for i, in db.session.query(Patient.id).order_by(Patient.id)]
+
+    windows, availability = {}, []
+    for doctor_id in doctor_ids:
+        windows[doctor_id] = {}
+        for day in sorted(rng.sample(DAYS, 5), key=DAYS.index):
+            start, end = time(rng.choice([8, 9, 10])), time(rng.choice([13, 15, 17, 18]))
+            windows[doctor_id][day] = (start, end)
+            availability.append({'doctor_id': doctor_id, 'day_of_week': day, 'start_time': start, 'end_time': end})
+    _insert(DoctorAvailability, availability)
+
+    today = date.today()
+    now = datetime.now()
+    first_day = today - timedelta(days=365 * years)
+    appointments = []
+    for doctor_id in doctor_ids:
+        for offset in range((today - first_day).days + future_days):
+            day = first_day + timedelta(days=offset)
+            window = windows[doctor_id].get(DAYS[day.weekday()])
+            if not window:
+                continue
+            start = window[0].hour * 60
+            slots = range(start, window[1].hour * 60, minutes)
+            for slot in rng.sample(slots, min(per_day, len(slots))):
+                when = datetime.combine(day, time.min) + timedelta(minutes=slot)
+                roll = rng.random()
+                if when < now:
+                    status = 'Completed' if roll < 0.85 else 'Cancelled' if roll < 0.95 else 'Booked'
+                else:
+                    status = 'Booked' if roll < 0.9 else 'Cancelled'
+                appointments.append({'patient_id': rng.choice(patient_ids), 'doctor_id': doctor_id,
+                                     'appointment_datetime': when, 'status': status})
+
+    treatments = 0
+    for start in range(0, len(appointments), CHUNK):
+        created = db.session.execute(insert(Appointment).returning(Appointment.id, Appointment.status),
+                                     appointments[start:start + CHUNK]).all()
+        rows = [{'appointment_id': appointment_id, 'diagnosis': f'Diagnosis {appointment_id}',
+                 'prescription': f'Prescription {appointment_id}'}
+                for appointment_id, status in created if status == 'Completed']
+        if rows:
+            db.session.execute(insert(Treatment), rows)
+        treatments += len(rows)
+    db.session.commit()
+
+    # Bulk inserts skip the mapper and session events that maintain these
+    sync_identities()
+    ensure_search_index()
+    clear_calendar()
+    rebuild_rollups()
+    for name in ('stats', 'reference'):
+        current_app.extensions[name].invalidate()
+    return {'departments': len(dept_ids), 'doctors': len(doctor_ids), 'patients': len(patient_ids),
+            'availability': len(availability), 'appointments': len(appointments), 'treatments': treatments}
@@ -0,0 +1,56 @@
+"""Measure login throughput for each password-hash cost setting.
+
+    python -m benchmarks.login_throughput --logins 200 --threads 8
+
+Each setting gets a fresh database whose users were hashed with that method,
+so the numbers reflect the check_password_hash cost of a real login.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+from migrations import setup_database
+from models import db, Patient
+from werkzeug.security import generate_password_hash
+
+METHODS = ['pbkdf2:sha256:600000', 'pbkdf2:sha256:260000', 'scrypt:32768:8:1', 'scrypt:16384:8:1']
+PASSWORD = 'bench-password'
+
+
+def run(method, logins, threads, workers):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'),
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_METHOD': method,
+        'PASSWORD_HASH_WORKERS': workers,
+    })
+    with app.app_context():
+        setup_database()
+        pwhash = generate_password_hash(PASSWORD, method)
+        db.session.add_all([Patient(name=f'Patient {i}', email=f'patient{i}@example.com', phone='0000000000',
+                                    password_hash=pwhash) for i in range(logins)])
+        db.session.commit()
+
+    def login(i):
+        response = app.test_client().post('/login', data={'email': f'patient{i}@example.com', 'password': PASSWORD})
+        return response.status_code == 302 and response.location.endswith('/patient/dashboard')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        ok = sum(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    print(f'{method:<24} logins={ok}/{logins} elapsed={elapsed:.2f}s throughput={logins / elapsed:.1f} logins/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4, help='PASSWORD_HASH_WORKERS')
+    parser.add_argument('--method', action='append', help='hash method to test (repeatable)')
+    args = parser.parse_args()
+    for method in args.method or METHODS:
+        run(method, args.logins, args.threads, args.workers)
@@ -0,0 +1,420 @@
+"""Latency, throughput and queries per request for every route.
+
+    python -m benchmarks.routes --doctors 20 --patients 1000 --years 1 --output run.json
+    python -m benchmarks.routes --compare baseline.json run.json
+
+Seeds a synthetic hospital (see benchmarks.hospital), then runs two phases
+through the Flask test client with logged-in admin, doctor and patient
+sessions:
+
+- sweep: every route `--iterations` times in turn on one thread
+- load: `--threads` threads, each with its own sessions, issuing a weighted
+  mix of routes for `--requests` requests in total
+
+Route choices and generated data come from `--seed`, so two runs with the
+same arguments send the same requests. Results are written as JSON.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import count
+
+from sqlalchemy.orm import aliased
+
+from app import create_app
+from models import db, Department, Doctor, Patient, Appointment, Treatment
+from benchmarks.hospital import seed_hospital, PASSWORD, DAYS
+
+# prepare(session) runs untimed and returns keyword arguments for call, or None
+# to skip; call(session, **kwargs) makes the timed request.
+Route = namedtuple('Route', 'name role weight call prepare')
+
+
+def route(name, role, weight, call, prepare=None):
+    return Route(name, role, weight, call, prepare)
+
+
+def get(url):
+    return lambda s, **kw: s.client().get(url(s, **kw) if callable(url) else url)
+
+
+class Hospital:
+    """Ids of the seeded data, shared by all sessions."""
+
+    def __init__(self, app, removable_fraction=0.1):
+        with app.app_context():
+            self.dept_ids = [i for i, in db.session.query(Department.id).order_by(Department.id)]
+            self.doctor_depts = dict(db.session.query(Doctor.id, Doctor.specialization_id).order_by(Doctor.id))
+            patients = [i for i, in db.session.query(Patient.id).order_by(Patient.id)]
+        self.doctor_ids = list(self.doctor_depts)
+        # The tail of the patient list is only used by the remove route
+        keep = max(1, int(len(patients) * (1 - removable_fraction)))
+        self.patient_ids, self.removable = patients[:keep], patients[keep:]
+        self._lock = threading.Lock()
+        self.serial = count()
+
+    def take_removable(self):
+        with self._lock:
+            return self.removable.pop() if self.removable else None
+
+
+class Session:
+    """One load-generator thread: a client per role, logged in as its own doctor and patient."""
+
+    def __init__(self, app, hospital, index, seed):
+        self.app = app
+        self.hospital = hospital
+        self.rng = random.Random(seed * 1000 + index)
+        self.doctor_id = hospital.doctor_ids[index % len(hospital.doctor_ids)]
+        self.patient_index = index % len(hospital.patient_ids)
+        self.patient_id = hospital.patient_ids[self.patient_index]
+        self.clients = {'anon': app.test_client()}
+        self.role = 'anon'
+        self._login('admin', 'admin', 'admin123')
+        self._login('doctor', f'doctor{self.hospital.doctor_ids.index(self.doctor_id)}@example.com', PASSWORD)
+        self._login('patient', f'patient{self.patient_index}@example.com', PASSWORD)
+
+    def _login(self, role, login, password):
+        client = self.app.test_client()
+        response = client.post('/login', data={'email': login, 'password': password})
+        if response.status_code != 302 or not response.location.endswith(f'/{role}/dashboard'):
+            raise RuntimeError(f'could not log in as {login}')
+        self.clients[role] = client
+
+    def client(self):
+        return self.clients[self.role]
+
+    def unique(self):
+        return next(self.hospital.serial)
+
+
+# ---------------------------------------------------------------------------
+# Untimed set-up for routes that need a particular row to act on
+# ---------------------------------------------------------------------------
+
+def _future_booked(s, **filters):
+    return Appointment.query.filter_by(status='Booked', **filters)\
+        .filter(Appointment.appointment_datetime > datetime.now()).order_by(Appointment.id)
+
+
+def prepare_book(s):
+    doctor_id = s.rng.choice(s.hospital.doctor_ids)
+    day = date.today() + timedelta(days=s.rng.randint(1, 20))
+    slots = s.clients['anon'].get(f'/api/available_slots/{doctor_id}/{day}').get_json()
+    if not slots:
+        return None
+    return {'data': {'department': str(s.hospital.doctor_depts[doctor_id]), 'doctor': str(doctor_id),
+                     'appointment_date': day.isoformat(), 'appointment_time': s.rng.choice(slots)}}
+
+
+def prepare_cancel(s):
+    appointment = _future_booked(s, patient_id=s.patient_id).first()
+    return appointment and {'appointment_id': appointment.id}
+
+
+def prepare_status(s):
+    appointment = _future_booked(s, doctor_id=s.doctor_id).first()
+    return appointment and {'appointment_id': appointment.id}
+
+
+def prepare_treatment(s):
+    treated = aliased(Treatment)
+    appointment = _future_booked(s, doctor_id=s.doctor_id).outerjoin(treated, treated.appointment_id == Appointment.id)\
+        .filter(treated.id.is_(None)).first()
+    return appointment and {'appointment_id': appointment.id}
+
+
+def prepare_history(s):
+    appointment = Appointment.query.filter_by(doctor_id=s.doctor_id).first()
+    return appointment and {'patient_id': appointment.patient_id}
+
+
+def prepare_remove(s):
+    patient_id = s.hospital.take_removable()
+    return patient_id and {'patient_id': patient_id}
+
+
+def prepare_logout(s):
+    client = s.app.test_client()
+    client.post('/login', data={'email': f'patient{s.patient_index}@example.com', 'password': PASSWORD})
+    return {'client': client}
+
+
+def _patients_csv(s, rows=20):
+    n = s.unique()
+    lines = ['name,email,phone,password'] + [f'Imported {n} {i},import{n}-{i}@example.com,5550000{i:03d},{PASSWORD}'
+                                             for i in range(rows)]
+    return {'file': (io.BytesIO('\n'.join(lines).encode()), 'patients.csv')}
+
+
+def _registration(s):
+    n = s.unique()
+    return {'name': f'New Patient {n}', 'email': f'new{n}@example.com', 'phone': '5550001234',
+            'password': PASSWORD, 'confirm_password': PASSWORD}
+
+
+def _doctor_form(s):
+    n = s.unique()
+    return {'name': f'New Doctor {n}', 'email': f'newdoctor{n}@example.com', 'phone': '5550001234',
+            'specialization': str(s.rng.choice(s.hospital.dept_ids)), 'password': PASSWORD}
+
+
+def _tomorrow(s):
+    return (date.today() + timedelta(days=1)).isoformat()
+
+
+ROUTES = [
+    route('GET index', 'anon', 2, get('/')),
+    route('GET register', 'anon', 1, get('/register')),
+    route('POST register', 'anon', 1, lambda s: s.client().post('/register', data=_registration(s))),
+    route('GET login', 'anon', 2, get('/login')),
+    route('POST login', 'anon', 2, lambda s: s.app.test_client().post(
+        '/login', data={'email': f'patient{s.patient_index}@example.com', 'password': PASSWORD})),
+    route('GET logout', 'anon', 1, lambda s, client: client.get('/logout'), prepare_logout),
+
+    route('GET admin_dashboard', 'admin', 3, get('/admin/dashboard')),
+    route('GET add_doctor', 'admin', 1, get('/admin/add_doctor')),
+    route('POST add_doctor', 'admin', 1, lambda s: s.client().post('/admin/add_doctor', data=_doctor_form(s))),
+    route('GET view_doctors', 'admin', 2, get('/admin/view_doctors')),
+    route('GET view_doctors?query', 'admin', 2, get(lambda s: f'/admin/view_doctors?query={s.rng.choice(["ash", "okafor", "cardio"])}')),
+    route('GET view_patients', 'admin', 2, get('/admin/view_patients')),
+    route('GET view_patients?query', 'admin', 2, get(lambda s: f'/admin/view_patients?query={s.rng.choice(["ben", "silva 1", "555"])}')),
+    route('GET view_appointments', 'admin', 2, get('/admin/view_appointments')),
+    route('GET export_data appointments.csv', 'admin', 0, get('/admin/export/appointments.csv')),
+    route('GET export_data patients.jsonl', 'admin', 0, get('/admin/export/patients.jsonl')),
+    route('POST import_data patients', 'admin', 0, lambda s: s.client().post(
+        '/admin/import/patients', data=_patients_csv(s))),
+    route('POST remove_user', 'admin', 0, lambda s, patient_id: s.client().post(f'/admin/remove/patient/{patient_id}'),
+          prepare_remove),
+    route('GET admin_chart_data', 'admin', 2, get('/api/chart_data/admin')),
+    route('GET report appointments', 'admin', 1, get(lambda s: f'/api/reports/appointments?group={s.rng.choice(["doctor", "department"])}')),
+    route('GET report rates', 'admin', 1, get(lambda s: f'/api/reports/rates?group={s.rng.choice(["doctor", "department"])}')),
+    route('GET report occupancy', 'admin', 1, get(lambda s: f'/api/reports/occupancy?group={s.rng.choice(["doctor", "department"])}')),
+    route('GET metrics', 'admin', 1, get('/metrics')),
+
+    route('GET doctor_dashboard', 'doctor', 4, get('/doctor/dashboard')),
+    route('POST update_appointment_status', 'doctor', 1, lambda s, appointment_id: s.client().post(
+        f'/doctor/appointment/{appointment_id}/update_status', data={'status': 'Completed'}), prepare_status),
+    route('GET add_treatment', 'doctor', 1, get(lambda s, appointment_id: f'/doctor/appointment/{appointment_id}/add_treatment'),
+          prepare_treatment),
+    route('POST add_treatment', 'doctor', 1, lambda s, appointment_id: s.client().post(
+        f'/doctor/appointment/{appointment_id}/add_treatment', data={'diagnosis': 'Benchmark', 'prescription': 'Rest'}),
+          prepare_treatment),
+    route('GET view_patient_history', 'doctor', 2, get(lambda s, patient_id: f'/doctor/patient_history/{patient_id}'),
+          prepare_history),
+    route('GET manage_availability', 'doctor', 1, get('/doctor/availability')),
+    route('POST manage_availability', 'doctor', 1, lambda s: s.client().post(
+        '/doctor/availability', data={'day': s.rng.choice(DAYS), 'start_time': '09:00', 'end_time': '17:00'})),
+
+    route('GET patient_dashboard', 'patient', 4, get('/patient/dashboard')),
+    route('GET book_appointment', 'patient', 2, get('/patient/book_appointment')),
+    route('POST book_appointment', 'patient', 2, lambda s, data: s.client().post('/patient/book_appointment', data=data),
+          prepare_book),
+    route('POST cancel_appointment', 'patient', 1, lambda s, appointment_id: s.client().post(
+        f'/patient/appointment/cancel/{appointment_id}'), prepare_cancel),
+    route('GET view_history', 'patient', 2, get('/patient/history')),
+
+    route('GET doctors_by_department', 'anon', 6, get(lambda s: f'/api/doctors_by_department/{s.rng.choice(s.hospital.dept_ids)}')),
+    route('GET available_slots', 'anon', 8, get(lambda s: f'/api/available_slots/{s.rng.choice(s.hospital.doctor_ids)}/{_tomorrow(s)}')),
+    route('GET available_slots_month', 'anon', 4, get(
+        lambda s: f'/api/available_slots/{s.rng.choice(s.hospital.doctor_ids)}/month/{date.today():%Y-%m}')),
+    route('GET department_available_slots', 'anon', 2, get(
+        lambda s: f'/api/available_slots/department/{s.rng.choice(s.hospital.dept_ids)}/{_tomorrow(s)}?days=7')),
+]
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+class Recorder:
+    """Latency, status and SQL statement count of every timed request, per route."""
+
+    def __init__(self, app):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.samples = defaultdict(list)
+        # Requests run on the calling thread, so the observer's count belongs to this thread's request
+        self._metrics = app.extensions['metrics']
+        self._metrics.add_observer(self._observe)
+
+    def close(self):
+        self._metrics.remove_observer(self._observe)
+
+    def _observe(self, endpoint, stats):
+        self._local.queries = stats['queries']
+
+    def run(self, s, entry):
+        s.role = entry.role
+        kwargs = {}
+        if entry.prepare:
+            with s.app.app_context():
+                kwargs = entry.prepare(s)
+            if not kwargs:
+                return False
+        self._local.queries = None
+        started = time.perf_counter()
+        response = entry.call(s, **kwargs)
+        response.get_data()
+        # Metrics are recorded when the response is closed, as a WSGI server would
+        response.close()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples[entry.name].append((elapsed, response.status_code, self._local.queries))
+        return True
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    # Nearest-rank, so the result is always an observed value
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed=None):
+    latencies = sorted(ms * 1000 for ms, _, _ in samples)
+    queries = [q for _, _, q in samples if q is not None]
+    summary = {
+        'requests': len(samples),
+        'errors': sum(status >= 500 for _, status, _ in samples),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'mean_ms': sum(latencies) / len(latencies) if latencies else None,
+        'queries_per_request': sum(queries) / len(queries) if queries else None,
+    }
+    if elapsed:
+        summary['throughput_rps'] = len(samples) / elapsed
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in summary.items()}
+
+
+def sweep(app, hospital, iterations, seed):
+    recorder = Recorder(app)
+    s = Session(app, hospital, 0, seed)
+    for entry in ROUTES:
+        for _ in range(iterations):
+            recorder.run(s, entry)
+    recorder.close()
+    return {name: summarize(samples) for name, samples in recorder.samples.items()}
+
+
+def load(app, hospital, threads, requests, seed):
+    recorder = Recorder(app)
+    sessions = [Session(app, hospital, i + 1, seed) for i in range(threads)]
+    weighted = [entry for entry in ROUTES if entry.weight]
+    weights = [entry.weight for entry in weighted]
+
+    def worker(s, n):
+        done = 0
+        while done < n:
+            if recorder.run(s, s.rng.choices(weighted, weights)[0]):
+                done += 1
+
+    per_thread = [requests // threads + (i < requests % threads) for i in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, sessions, per_thread))
+    elapsed = time.perf_counter() - started
+    recorder.close()
+    everything = [sample for samples in recorder.samples.values() for sample in samples]
+    return {'threads': threads, 'elapsed_s': round(elapsed, 3), 'overall': summarize(everything, elapsed),
+            'routes': {name: summarize(samples, elapsed) for name, samples in sorted(recorder.samples.items())}}
+
+
+def run(args):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'),
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_METHOD': args.hash_method,
+        'JOB_WORKERS': args.job_workers,
+    })
+    started = time.perf_counter()
+    with app.app_context():
+        seeded = seed_hospital(departments=args.departments, doctors=args.doctors, patients=args.patients,
+                               years=args.years, per_day=args.per_day, seed=args.seed, hash_method=args.hash_method)
+    seeded['seconds'] = round(time.perf_counter() - started, 3)
+    print(f'seeded {seeded}', file=sys.stderr)
+
+    hospital = Hospital(app)
+    result = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'environment': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                        'platform': platform.platform(), 'started_at': datetime.now().isoformat(timespec='seconds')},
+        'seeded': seeded,
+        'sweep': sweep(app, hospital, args.iterations, args.seed),
+    }
+    result['load'] = load(app, hospital, args.threads, args.requests, args.seed)
+    app.extensions['jobs'].stop()
+    return result
+
+
+def print_result(result):
+    print(f'{"route":<36} {"n":>5} {"p50":>8} {"p95":>8} {"p99":>8} {"queries":>8}')
+    for name, r in result['sweep'].items():
+        print(f'{name:<36} {r["requests"]:>5} {r["p50_ms"]:>8.2f} {r["p95_ms"]:>8.2f} {r["p99_ms"]:>8.2f} '
+              f'{r["queries_per_request"] if r["queries_per_request"] is not None else "-":>8}')
+    overall = result['load']['overall']
+    print(f'\nload: threads={result["load"]["threads"]} requests={overall["requests"]} errors={overall["errors"]} '
+          f'throughput={overall["throughput_rps"]:.1f} req/s p50={overall["p50_ms"]:.2f}ms '
+          f'p95={overall["p95_ms"]:.2f}ms p99={overall["p99_ms"]:.2f}ms queries/request={overall["queries_per_request"]}')
+
+
+def _change(old, new):
+    if old in (None, 0) or new is None:
+        return '-'
+    return f'{(new - old) / old * 100:+.0f}%'
+
+
+def compare(baseline, current):
+    print(f'{"route":<36} {"p50":>16} {"p95":>16} {"queries":>14}')
+    for name, new in current['sweep'].items():
+        old = baseline['sweep'].get(name)
+        if old is None:
+            continue
+        print(f'{name:<36} {new["p50_ms"]:>8.2f} {_change(old["p50_ms"], new["p50_ms"]):>7} '
+              f'{new["p95_ms"]:>8.2f} {_change(old["p95_ms"], new["p95_ms"]):>7} '
+              f'{str(new["queries_per_request"]):>7} {_change(old["queries_per_request"], new["queries_per_request"]):>6}')
+    old, new = baseline['load']['overall'], current['load']['overall']
+    print(f'\nload throughput {new["throughput_rps"]:.1f} req/s ({_change(old["throughput_rps"], new["throughput_rps"])}), '
+          f'p95 {new["p95_ms"]:.2f}ms ({_change(old["p95_ms"], new["p95_ms"])})')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--departments', type=int, default=6)
+    parser.add_argument('--doctors', type=int, default=20)
+    parser.add_argument('--patients', type=int, default=1000)
+    parser.add_argument('--years', type=int, default=1, help='years of appointment history')
+    parser.add_argument('--per-day', type=int, default=4, help='appointments per doctor per working day')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--iterations', type=int, default=20, help='sweep requests per route')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000, help='load phase requests in total')
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1000',
+                        help='cheap by default so logins measure the app rather than the hash')
+    parser.add_argument('--job-workers', type=int, default=0, help='JOB_WORKERS during the run')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='compare two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            compare(json.load(f), json.load(g))
+        sys.exit()
+    result = run(args)
+    print_result(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
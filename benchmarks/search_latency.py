@@ -0,0 +1,68 @@
+"""Patient search latency against table size for each search backend.
+
+    python -m benchmarks.search_latency --sizes 1000 10000 50000
+
+Compares the FTS5 and trigram backends with the old LIKE '%q%' scan.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import insert
+
+from app import create_app
+from migrations import setup_database
+from models import db, Patient
+from search import search_page, rebuild_search_index
+
+FIRST = ['Asha', 'Ben', 'Chen', 'Dara', 'Elif', 'Farid', 'Gita', 'Hugo', 'Ines', 'Jomo', 'Kai', 'Lena']
+LAST = ['Okafor', 'Silva', 'Novak', 'Tanaka', 'Haddad', 'Larsen', 'Mehta', 'Quispe', 'Rossi', 'Walsh']
+
+
+def seed(size, rng):
+    rows = [{'name': f'{rng.choice(FIRST)} {rng.choice(LAST)} {i}', 'email': f'patient{i}@example.com',
+             'phone': f'{rng.randrange(10 ** 9, 10 ** 10)}', 'password_hash': 'x'} for i in range(size)]
+    db.session.execute(insert(Patient), rows)
+    db.session.commit()
+
+
+def like_search(q):
+    # The LIKE '%q%' scan the admin search used before the search index
+    return Patient.query.filter(Patient.name.contains(q) | Patient.id.like(f'%{q}%') | Patient.phone.contains(q))\
+        .order_by(Patient.id).limit(51).all()
+
+
+def timed(func, queries, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for q in queries:
+            func(q)
+    return (time.perf_counter() - started) * 1000 / (repeat * len(queries))
+
+
+def run(size, repeat):
+    rng = random.Random(size)
+    queries = ['ash', 'okafor', 'ben sil', 'patient12', '555', 'lena ross']
+    results = {}
+    for backend in ('fts5', 'trigram'):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'),
+                          'SEARCH_BACKEND': backend})
+        with app.app_context(), app.test_request_context():
+            setup_database()
+            seed(size, rng)
+            rebuild_search_index()
+            results[backend] = timed(lambda q: search_page('patient', q), queries, repeat)
+            if backend == 'fts5':
+                results['like'] = timed(like_search, queries, repeat)
+    print(f'patients={size:<7} ' + ' '.join(f'{name}={ms:7.2f}ms' for name, ms in results.items()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.repeat)
@@ -0,0 +1,86 @@
+"""Time process startup: importing the app, running the factory and serving the first request.
+
+    python -m benchmarks.startup --runs 10 --patients 2000
+
+Every run is a fresh interpreter, so imports are cold. "cold db" points at a
+database file that does not exist yet; "warm db" at one already set up and
+seeded with a synthetic hospital. Each is timed with the bare factory (what a
+web worker does) and with the factory followed by `setup_database` (what
+every worker used to do before schema creation and seeding moved to
+`flask init-db`).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ['import', 'factory', 'setup', 'first_request']
+
+
+def child(uri, setup):
+    """Runs in the timed subprocess; prints one JSON line of phase timings in ms."""
+    started = time.perf_counter()
+    from app import create_app
+    from migrations import setup_database
+    imported = time.perf_counter()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'JOB_WORKERS': 0})
+    built = time.perf_counter()
+    if setup:
+        with app.app_context():
+            setup_database()
+    ready = time.perf_counter()
+    app.test_client().get('/login')
+    served = time.perf_counter()
+    print(json.dumps({'import': (imported - started) * 1000, 'factory': (built - imported) * 1000,
+                      'setup': (ready - built) * 1000, 'first_request': (served - ready) * 1000}))
+
+
+def spawn(uri, setup):
+    command = [sys.executable, '-m', 'benchmarks.startup', '--child', uri] + (['--setup'] if setup else [])
+    output = subprocess.run(command, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def warm_database(workdir, patients):
+    from app import create_app
+    from benchmarks.hospital import seed_hospital
+    uri = 'sqlite:///' + os.path.join(workdir, 'warm.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'JOB_WORKERS': 0})
+    with app.app_context():
+        seed_hospital(doctors=max(patients // 50, 1), patients=patients)
+    return uri
+
+
+def run(runs, patients):
+    workdir = tempfile.mkdtemp()
+    warm = warm_database(workdir, patients)
+    print(f'{"scenario":<22}' + ''.join(f'{phase:>15}' for phase in PHASES) + f'{"total":>12}')
+    for db_state in ('cold db', 'warm db'):
+        for setup in (False, True):
+            samples = []
+            for i in range(runs):
+                uri = warm if db_state == 'warm db' else 'sqlite:///' + os.path.join(workdir, f'cold-{setup}-{i}.db')
+                samples.append(spawn(uri, setup))
+            medians = {phase: statistics.median(s[phase] for s in samples) for phase in PHASES}
+            label = f'{db_state}, {"+setup" if setup else "factory"}'
+            print(f'{label:<22}' + ''.join(f'{medians[phase]:>13.1f}ms' for phase in PHASES)
+                  + f'{sum(medians.values()):>10.1f}ms')
+    print(f'(median of {runs} runs)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--patients', type=int, default=2000, help='size of the warm database')
+    parser.add_argument('--child', metavar='URI', help=argparse.SUPPRESS)
+    parser.add_argument('--setup', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.setup)
+    else:
+        run(args.runs, args.patients)
@@ -0,0 +1,46 @@
+import time
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from models import db, Appointment
+from identity import active
+from notifications import appointment_booked
+
+
+def _is_busy(error):
+    message = str(error.orig).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def book_slot(patient_id, doctor_id, appointment_datetime, attempts=None, backoff=None):
+    """Insert a booking and return it, or None if the slot is already taken or the doctor is no longer active.
+
+    The unique index on active (doctor_id, appointment_datetime) rows decides who
+    wins a race, so there is no read-then-write window. The doctor is checked
+    after the insert, inside the same write transaction, so a doctor removed
+    while another worker still lists them never gets the booking. A locked SQLite database
+    is retried with exponential backoff before the error is raised. The
+    confirmation and reminder jobs are committed together with the booking.
+    """
+    attempts = attempts or current_app.config.get('BOOKING_RETRIES', 5)
+    backoff = backoff or current_app.config.get('BOOKING_RETRY_BACKOFF', 0.05)
+    for attempt in range(attempts):
+        appointment = Appointment(patient_id=patient_id, doctor_id=doctor_id,
+                                  appointment_datetime=appointment_datetime, status='Booked')
+        db.session.add(appointment)
+        try:
+            db.session.flush()
+            if not db.session.scalar(select(active('doctor', doctor_id))):
+                db.session.rollback()
+                return None
+            appointment_booked(appointment)
+            db.session.commit()
+            return appointment
+        except IntegrityError:
+            db.session.rollback()
+            return None
+        except OperationalError as e:
+            db.session.rollback()
+            if not _is_busy(e) or attempt == attempts - 1:
+                raise
+            time.sleep(backoff * 2 ** attempt)
@@ -0,0 +1,289 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from itertools import islice
+
+import click
+from email_validator import validate_email, EmailNotValidError
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from models import db, Doctor, Patient, Department, Appointment, Identity
+from exports import EXPORTS, FORMATS, stream_export
+from passwords import DEFAULT_METHOD, is_verifiable
+
+STATUSES = ('Booked', 'Completed', 'Cancelled')
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) from a CSV or JSONL text stream without loading it all."""
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_no, RowError(f'invalid JSON: {e}')
+                    continue
+                yield line_no, row if isinstance(row, dict) else RowError('expected a JSON object')
+    else:
+        # Line 1 is the header
+        for line_no, row in enumerate(csv.DictReader(stream), 2):
+            yield line_no, row
+
+
+def _text(row, field, min_len=1, max_len=None):
+    value = str(row.get(field) or '').strip()
+    if not value:
+        raise RowError(f'{field} is required')
+    if len(value) < min_len or (max_len and len(value) > max_len):
+        raise RowError(f'{field} must be {min_len}-{max_len} characters' if max_len else f'{field} must be at least {min_len} characters')
+    return value
+
+
+def _email(row, field='email'):
+    try:
+        return validate_email(_text(row, field), check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        raise RowError(f'{field}: {e}')
+
+
+def _account(row):
+    mapping = {'name': _text(row, 'name', 2, 100), 'email': _email(row), 'phone': _text(row, 'phone', 10, 15)}
+    if row.get('password_hash'):
+        if not is_verifiable(str(row['password_hash'])):
+            raise RowError('password_hash is not a supported werkzeug hash (scrypt or pbkdf2)')
+        mapping['password_hash'] = row['password_hash']
+    else:
+        mapping['password'] = _text(row, 'password', 6)
+    return mapping
+
+
+class Importer:
+    """Validate and insert one kind of record in fixed-size batches.
+
+    Each batch is checked against the database in a single query, has its
+    passwords hashed across a process pool and is inserted with one executemany
+    and one commit. Bad rows are reported and skipped; the rest of the batch
+    still goes in.
+    """
+
+    def __init__(self, kind, batch_size=500, hash_pool=None):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.hash_pool = hash_pool
+        self.method = current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        self.departments = {d.name.lower(): d.id for d in Department.query} if kind == 'doctors' else None
+        self.inserted = 0
+
+    def run(self, rows):
+        """Consume (line number, row) pairs; yields (line number, error message) for rejected rows."""
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            yield from self._import_batch(batch)
+        self._refresh_derived()
+
+    def _import_batch(self, batch):
+        valid = []
+        for line_no, row in batch:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                valid.append((line_no, getattr(self, f'_validate_{self.kind}')(row)))
+            except RowError as e:
+                yield line_no, str(e)
+        valid, errors = self._check_against_db(valid)
+        yield from errors
+        self._hash_passwords([mapping for _, mapping in valid])
+        yield from self._insert(valid)
+
+    def _validate_patients(self, row):
+        return _account(row)
+
+    def _validate_doctors(self, row):
+        mapping = _account(row)
+        department = self.departments.get(_text(row, 'department').lower())
+        if department is None:
+            raise RowError(f'unknown department {row.get("department")!r}')
+        mapping['specialization_id'] = department
+        return mapping
+
+    def _validate_appointments(self, row):
+        value = _text(row, 'appointment_datetime')
+        try:
+            appointment_datetime = datetime.fromisoformat(value)
+        except ValueError:
+            raise RowError(f'appointment_datetime {value!r} is not YYYY-MM-DD HH:MM')
+        status = str(row.get('status') or 'Booked').strip().title()
+        if status not in STATUSES:
+            raise RowError(f'status must be one of {", ".join(STATUSES)}')
+        return {'patient_email': _email(row, 'patient_email'), 'doctor_email': _email(row, 'doctor_email'),
+                'appointment_datetime': appointment_datetime, 'status': status}
+
+    def _check_against_db(self, valid):
+        errors = []
+        if self.kind == 'appointments':
+            logins = {m['patient_email'] for _, m in valid} | {m['doctor_email'] for _, m in valid}
+            ids = {(i.role, i.login): i.user_id for i in
+                   Identity.query.filter(Identity.login.in_(logins), Identity.role.in_(['doctor', 'patient']))}
+            resolved = []
+            for line_no, m in valid:
+                patient_id, doctor_id = ids.get(('patient', m['patient_email'])), ids.get(('doctor', m['doctor_email']))
+                if patient_id is None or doctor_id is None:
+                    errors.append((line_no, 'unknown patient_email' if patient_id is None else 'unknown doctor_email'))
+                    continue
+                resolved.append((line_no, {'patient_id': patient_id, 'doctor_id': doctor_id,
+                                           'appointment_datetime': m['appointment_datetime'], 'status': m['status']}))
+            return resolved, errors
+
+        Model = Doctor if self.kind == 'doctors' else Patient
+        taken = set(db.session.scalars(select(Model.email).where(Model.email.in_([m['email'] for _, m in valid]))))
+        unique = []
+        for line_no, m in valid:
+            if m['email'] in taken:
+                errors.append((line_no, f'email {m["email"]} already exists'))
+            else:
+                taken.add(m['email'])
+                unique.append((line_no, m))
+        return unique, errors
+
+    def _hash_passwords(self, mappings):
+        pending = [m for m in mappings if 'password' in m]
+        if not pending:
+            return
+        passwords = [m.pop('password') for m in pending]
+        hasher = partial(generate_password_hash, method=self.method)
+        hashes = self.hash_pool.map(hasher, passwords, chunksize=16) if self.hash_pool else map(hasher, passwords)
+        for mapping, pwhash in zip(pending, hashes):
+            mapping['password_hash'] = pwhash
+
+    def _insert(self, valid):
+        if not valid:
+            return
+        Model = {'patients': Patient, 'doctors': Doctor, 'appointments': Appointment}[self.kind]
+        try:
+            self._insert_rows(Model, [m for _, m in valid])
+            db.session.commit()
+            self.inserted += len(valid)
+            return
+        except IntegrityError:
+            db.session.rollback()
+        # Something in the batch clashed (a taken slot, a concurrent insert); retry row by row
+        for line_no, mapping in valid:
+            try:
+                self._insert_rows(Model, [mapping])
+                db.session.commit()
+                self.inserted += 1
+            except IntegrityError as e:
+                db.session.rollback()
+                yield line_no, f'conflicts with an existing record: {e.orig}'
+
+    def _insert_rows(self, Model, mappings):
+        if Model is Appointment:
+            db.session.execute(insert(Appointment), mappings)
+            return
+        # Bulk inserts skip mapper events, so write the identity rows alongside
+        role = 'doctor' if Model is Doctor else 'patient'
+        created = db.session.execute(insert(Model).returning(Model.id, Model.email), mappings).all()
+        db.session.execute(insert(Identity), [{'login': email, 'role': role, 'user_id': user_id}
+                                              for user_id, email in created])
+
+    def _refresh_derived(self):
+        # The search index, slot calendar, API cache, form choices, report rollups
+        # and dashboard counters are also maintained by events that bulk inserts bypass; bring
+        # them back in line once per run
+        from search import ensure_search_index
+        from slot_calendar import clear_calendar
+        from reports import rebuild_rollups
+        from http_cache import bump_versions
+        if self.inserted:
+            if self.kind != 'appointments':
+                ensure_search_index()
+                current_app.extensions['reference'].invalidate()
+            else:
+                clear_calendar()
+                rebuild_rollups()
+            bump_versions(self.kind)
+            db.session.commit()
+            current_app.extensions['stats'].invalidate()
+
+
+def import_stream(kind, stream, fmt, batch_size=None, processes=None):
+    """Import a text stream.
+
+    A generator: yields (line number, error message) for each rejected row and
+    returns the number of rows inserted (the StopIteration value).
+    """
+    batch_size = batch_size or current_app.config.get('IMPORT_BATCH_SIZE', 500)
+    processes = processes if processes is not None else current_app.config.get('IMPORT_HASH_PROCESSES')
+    # Spawned, not forked: a fork of a threaded web worker can inherit held locks
+    # and open database connections. The hashers only need werkzeug.
+    spawn = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count(), mp_context=spawn) as pool:
+        importer = Importer(kind, batch_size, pool)
+        errors = importer.run(read_rows(stream, fmt))
+        yield from errors
+    return importer.inserted
+
+
+def _format_for(path, fmt):
+    return fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+
+data_cli = AppGroup('data', help='Bulk import and export of patients, doctors and appointments.')
+
+
+@data_cli.command('import')
+@click.argument('kind', type=click.Choice(list(EXPORTS)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, help='Rows per commit (IMPORT_BATCH_SIZE).')
+@click.option('--processes', type=int, help='Password hashing processes (defaults to CPU count).')
+def import_command(kind, source, fmt, batch_size, processes):
+    """Import KIND rows from SOURCE ('-' for stdin). Rejected rows are reported on stderr."""
+    errors = import_stream(kind, source, _format_for(source.name, fmt), batch_size, processes)
+    failed = 0
+    while True:
+        try:
+            line_no, message = next(errors)
+        except StopIteration as done:
+            inserted = done.value
+            break
+        failed += 1
+        click.echo(f'line {line_no}: {message}', err=True)
+    click.echo(f'Imported {inserted} {kind}, rejected {failed}.')
+
+
+@data_cli.command('export')
+@click.argument('kind', type=click.Choice(list(EXPORTS)))
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), help='Defaults to the file extension.')
+def export_command(kind, target, fmt):
+    """Export KIND to TARGET (default stdout)."""
+    for chunk in stream_export(kind, _format_for(target.name, fmt)):
+        target.write(chunk)
+
+
+def spool_upload(file_storage):
+    # Werkzeug closes uploaded files when the view returns, before a streamed
+    # response has been consumed, so copy the upload to a file we own first
+    spool = tempfile.TemporaryFile()
+    file_storage.save(spool)
+    spool.seek(0)
+    return io.TextIOWrapper(spool, encoding='utf-8', newline='')
@@ -0,0 +1,104 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.engine import make_url
+from models import db
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def load_database_config(config):
+    """Fill database settings from the environment, keeping anything already set."""
+    config.setdefault('SQLALCHEMY_DATABASE_URI', os.environ.get('DATABASE_URL', 'sqlite:///hospital.db'))
+    config.setdefault('DB_POOL_SIZE', int(os.environ.get('DB_POOL_SIZE', 5)))
+    config.setdefault('DB_MAX_OVERFLOW', int(os.environ.get('DB_MAX_OVERFLOW', 10)))
+    config.setdefault('DB_POOL_TIMEOUT', int(os.environ.get('DB_POOL_TIMEOUT', 30)))
+    config.setdefault('DB_POOL_RECYCLE', int(os.environ.get('DB_POOL_RECYCLE', 1800)))
+    config.setdefault('DB_POOL_PRE_PING', _env_bool('DB_POOL_PRE_PING', True))
+    config.setdefault('SQLITE_JOURNAL_MODE', os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'))
+    config.setdefault('SQLITE_SYNCHRONOUS', os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'))
+    config.setdefault('SQLITE_BUSY_TIMEOUT', int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)))
+    config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(config))
+
+
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    if url.get_backend_name() == 'sqlite':
+        options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}
+        if url.database in (None, '', ':memory:'):
+            # In-memory databases live in a single connection; pool sizing does not apply
+            return options
+    options.update(pool_size=config['DB_POOL_SIZE'], max_overflow=config['DB_MAX_OVERFLOW'],
+                   pool_timeout=config['DB_POOL_TIMEOUT'], pool_recycle=config['DB_POOL_RECYCLE'])
+    return options
+
+
+def init_database(app):
+    db.init_app(app)
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = [f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+               f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+               f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT']}"]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def insert_ignore(connection, Model):
+    """INSERT that skips rows conflicting with a unique constraint."""
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(Model).on_conflict_do_nothing()
+
+
+# ---------------------------------------------------------------------------
+# Per-transaction change tracking
+# ---------------------------------------------------------------------------
+
+_tracked = {}
+
+
+def track_commits(key, apply, collect=None, factory=set):
+    """Gather changes per transaction in session.info[key] and pass them to `apply` once it commits.
+
+    `collect(session, gathered)` runs after every flush; code can also add to
+    `pending(key)` directly. A rollback drops what was gathered. A key is
+    registered once, however many apps are created.
+    """
+    if key in _tracked:
+        return
+    _tracked[key] = factory
+
+    def after_flush(session, flush_context):
+        collect(session, pending(key, session))
+
+    def after_commit(session):
+        gathered = session.info.pop(key, None)
+        if gathered:
+            apply(gathered)
+
+    def after_soft_rollback(session, previous_transaction):
+        session.info.pop(key, None)
+
+    if collect is not None:
+        event.listen(db.session, 'after_flush', after_flush)
+    event.listen(db.session, 'after_commit', after_commit)
+    event.listen(db.session, 'after_soft_rollback', after_soft_rollback)
+
+
+def pending(key, session=None):
+    """What has been gathered under `key` in the current transaction."""
+    info = (session or db.session).info
+    if key not in info:
+        info[key] = _tracked[key]()
+    return info[key]
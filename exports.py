@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+import queries
+
+# Column layout for each exportable listing: (header, paged query, row builder).
+# The email columns let an export be fed straight back into `flask data import`.
+EXPORTS = {
+    'appointments': (
+        ['id', 'patient', 'patient_email', 'doctor', 'doctor_email', 'department', 'appointment_datetime', 'status'],
+        queries.appointment_page,
+        lambda a: [a.id, a.patient.name, a.patient.email, a.doctor.name, a.doctor.email, a.doctor.department.name,
+                   a.appointment_datetime.strftime('%Y-%m-%d %H:%M'), a.status],
+    ),
+    'doctors': (
+        ['id', 'name', 'department', 'email', 'phone'],
+        queries.doctor_page,
+        lambda d: [d.id, d.name, d.department.name, d.email, d.phone],
+    ),
+    'patients': (
+        ['id', 'name', 'email', 'phone'],
+        queries.patient_page,
+        lambda p: [p.id, p.name, p.email, p.phone],
+    ),
+}
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def stream_csv(kind, batch_size=500):
+    """Generate a CSV export chunk by chunk; memory use is bounded by `batch_size`."""
+    header, page_func, build_row = EXPORTS[kind]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, item in enumerate(queries.iter_pages(page_func, batch_size), 1):
+        writer.writerow(build_row(item))
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_jsonl(kind, batch_size=500):
+    """Same as `stream_csv`, one JSON object per line."""
+    header, page_func, build_row = EXPORTS[kind]
+    chunk = []
+    for item in queries.iter_pages(page_func, batch_size):
+        chunk.append(json.dumps(dict(zip(header, build_row(item)))) + '\n')
+        if len(chunk) == batch_size:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk)
+
+
+def stream_export(kind, fmt, batch_size=500):
+    return (stream_jsonl if fmt == 'jsonl' else stream_csv)(kind, batch_size)
@@ -1,8 +1,8 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField, SelectField, DateField, TimeField
 from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length
-from wtforms_sqlalchemy.fields import QuerySelectField
-from models import Patient, Department, Doctor
+from models import Patient, Doctor
+from reference import get_reference
 from datetime import date
 
 class RegistrationForm(FlaskForm):
@@ -23,17 +23,22 @@ class LoginForm(FlaskForm):
     password = PasswordField('Password', validators=[DataRequired()])
     submit = SubmitField('Login')
 
-def department_query():
-    return Department.query
+def department_choices():
+    # Served from the reference-data cache; no query per render or validation
+    return [(dept_id, name) for dept_id, name in get_reference().departments()]
 
 class AddDoctorForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired(), Length(min=2, max=100)])
     email = StringField('Email', validators=[DataRequired(), Email()])
     phone = StringField('Phone Number', validators=[DataRequired(), Length(min=10, max=15)])
-    specialization = QuerySelectField('Specialization', query_factory=department_query, get_label='name', allow_blank=False)
+    specialization = SelectField('Specialization', coerce=int)
     password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
     submit = SubmitField('Add Doctor')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.specialization.choices = department_choices()
+
     def validate_email(self, email):
         user = Doctor.query.filter_by(email=email.data).first()
         if user:
@@ -45,12 +50,19 @@ class TreatmentForm(FlaskForm):
     submit = SubmitField('Submit Treatment')
 
 class BookAppointmentForm(FlaskForm):
-    department = QuerySelectField('Select Department', query_factory=department_query, get_label='name', allow_blank=True, validators=[DataRequired()])
+    department = SelectField('Select Department', validators=[DataRequired()])
     doctor = SelectField('Select Doctor', choices=[], validators=[DataRequired(message="Please select a department first to see available doctors.")])
     appointment_date = DateField('Select Date', validators=[DataRequired()], format='%Y-%m-%d')
     appointment_time = SelectField('Select Time', choices=[], validators=[DataRequired(message="Please select a date to see available times.")])
     submit = SubmitField('Book Appointment')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.department.choices = [('', '')] + [(str(dept_id), name) for dept_id, name in department_choices()]
+
+    def doctor_choices(self):
+        return [(str(doctor_id), name) for doctor_id, name in get_reference().doctors(self.department.data)]
+
     def validate_appointment_date(self, appointment_date):
         if appointment_date.data < date.today():
             raise ValidationError("You cannot book an appointment in the past.")
@@ -0,0 +1,139 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from flask import current_app, request, Response
+from sqlalchemy import event, select, update, tuple_
+from models import db, Department, Doctor, DoctorAvailability, Appointment, DataVersion
+from database import insert_ignore
+
+Entry = namedtuple('Entry', 'versions expires etag body')
+
+
+# Data versions live in the database so every worker sees a change as soon as
+# it commits. A bump moves the topic's ANY row and either the scoped row (a
+# doctor id) or, for a topic-wide change, the WHOLE row. Unscoped keys read
+# ANY; scoped keys read WHOLE and their own scope.
+ANY, WHOLE = -1, 0
+
+
+def _bump(connection, topic, scope=None):
+    for row_scope in (ANY, WHOLE if scope is None else scope):
+        change = update(DataVersion).where(DataVersion.topic == topic, DataVersion.scope == row_scope)\
+            .values(version=DataVersion.version + 1)
+        if not connection.execute(change).rowcount:
+            connection.execute(insert_ignore(connection, DataVersion), {'topic': topic, 'scope': row_scope, 'version': 0})
+            connection.execute(change)
+
+
+def current_versions(keys):
+    """The versions of `keys` (a topic, or a (topic, scope) pair) in one query."""
+    wanted = set()
+    for key in keys:
+        wanted |= {key, (key[0], WHOLE)} if isinstance(key, tuple) else {(key, ANY)}
+    if not wanted:
+        return ()
+    found = dict(((topic, scope), version) for topic, scope, version in db.session.execute(
+        select(DataVersion.topic, DataVersion.scope, DataVersion.version)
+        .where(tuple_(DataVersion.topic, DataVersion.scope).in_(list(wanted)))))
+    return tuple((found.get((key[0], WHOLE), 0), found.get(key, 0)) if isinstance(key, tuple)
+                 else found.get((key, ANY), 0) for key in keys)
+
+
+class ResponseCache:
+    """LRU of serialized JSON responses, each valid for `ttl` seconds and the data versions it was built from."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.versions != versions or entry.expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, versions, ttl, body):
+        entry = Entry(versions, time.monotonic() + ttl, hashlib.sha1(body).hexdigest(), body)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_json(ttl_key, max_age_key=None, depends=lambda **view_args: ()):
+    """Serve a JSON view from the response cache with an ETag and Cache-Control.
+
+    `depends` maps the view arguments to the data-version keys the response is
+    built from, e.g. ``('appointments', doctor_id)``. Without `max_age_key`
+    clients must revalidate every time, which costs a 304 when nothing changed.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            cache = current_app.extensions['response_cache']
+            key = (request.endpoint, request.full_path)
+            # Read versions before building so a change made meanwhile is never cached as current
+            versions = current_versions(depends(**view_args))
+            entry = cache.get(key, versions)
+            if entry is None:
+                response = current_app.make_response(view(**view_args))
+                if response.status_code != 200 or not response.is_json:
+                    return response
+                entry = cache.put(key, versions, current_app.config[ttl_key], response.get_data())
+
+            response = Response(entry.body, mimetype='application/json')
+            response.set_etag(entry.etag)
+            max_age = current_app.config[max_age_key] if max_age_key else 0
+            if max_age:
+                response.cache_control.public = True
+                response.cache_control.max_age = max_age
+            else:
+                response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+def bump_versions(topic, scope=None):
+    """Invalidate cached responses built from `topic` when the current transaction commits."""
+    _bump(db.session.connection(), topic, scope)
+
+
+def _doctor_changed(mapper, connection, target):
+    _bump(connection, 'doctors', target.id)
+
+
+def _department_changed(mapper, connection, target):
+    _bump(connection, 'departments', target.id)
+
+
+def _availability_changed(mapper, connection, target):
+    _bump(connection, 'availability', target.doctor_id)
+
+
+def _appointment_changed(mapper, connection, target):
+    _bump(connection, 'appointments', target.doctor_id)
+
+
+def init_http_cache(app):
+    app.extensions['response_cache'] = ResponseCache(app.config.get('API_CACHE_SIZE', 1024))
+    if event.contains(Doctor, 'after_insert', _doctor_changed):
+        return
+    for Model, listener in ((Doctor, _doctor_changed), (Department, _department_changed),
+                            (DoctorAvailability, _availability_changed), (Appointment, _appointment_changed)):
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(Model, name, listener)
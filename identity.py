@@ -0,0 +1,140 @@
+import json
+import time
+from flask import current_app
+from sqlalchemy import event, insert, update, delete, select, literal, exists
+from sqlalchemy.orm import make_transient_to_detached
+from models import db, Admin, Doctor, Patient, Identity, Job
+from passwords import needs_rehash
+
+ROLE_MODELS = {'admin': Admin, 'doctor': Doctor, 'patient': Patient}
+# When the same login exists under several roles, try them in this order
+ROLE_ORDER = ('admin', 'doctor', 'patient')
+LOGIN_COLUMNS = {'admin': Admin.username, 'doctor': Doctor.email, 'patient': Patient.email}
+
+
+def role_of(user):
+    return next(role for role, Model in ROLE_MODELS.items() if isinstance(user, Model))
+
+
+def login_of(user):
+    return user.username if isinstance(user, Admin) else user.email
+
+
+def authenticate(login, password):
+    """Return (user, role) for the account matching login and password, or (None, None)."""
+    candidates = sorted(Identity.query.filter_by(login=login), key=lambda i: ROLE_ORDER.index(i.role))
+    for identity in candidates:
+        user = db.session.get(ROLE_MODELS[identity.role], identity.user_id)
+        if user and user.check_password(password):
+            if needs_rehash(user.password_hash):
+                # Upgrade hashes made with outdated parameters while we have the plain password
+                user.set_password(password)
+                db.session.commit()
+            return user, identity.role
+    return None, None
+
+
+def active(role, id_column):
+    """SQL condition that the account still has its login, i.e. it is not being removed."""
+    return exists().where(Identity.role == role, Identity.user_id == id_column)
+
+
+def disable_account(role, user_id):
+    """Drop the account's login in the current transaction, ahead of its removal.
+
+    Login, session loading and the doctor lists skip accounts without an
+    identity row. Returns False if the account was already disabled.
+    """
+    removed = db.session.execute(delete(Identity).where(Identity.role == role, Identity.user_id == user_id)).rowcount
+    current_app.extensions['user_cache'].discard(role, user_id)
+    return bool(removed)
+
+
+class UserCache:
+    """Short-lived cache of logged-in users' column values for `load_user`.
+
+    Hits are merged back into the request's session with load=False, which
+    attaches the user without a round-trip while keeping lazy relationships
+    working. Entries are dropped when the account is updated or deleted here;
+    other workers see such changes within `ttl` seconds.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._entries = {}
+
+    def get(self, role, user_id):
+        entry = self._entries.get((role, user_id))
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        user = ROLE_MODELS[role](**entry[1])
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def put(self, role, user):
+        if self.ttl > 0:
+            values = {attr.key: getattr(user, attr.key) for attr in db.inspect(user).mapper.column_attrs}
+            self._entries[role, user.id] = (time.monotonic() + self.ttl, values)
+
+    def discard(self, role, user_id):
+        self._entries.pop((role, user_id), None)
+
+
+def load_identity(role, user_id):
+    Model = ROLE_MODELS.get(role)
+    if Model is None:
+        return None
+    cache = current_app.extensions['user_cache']
+    user = cache.get(role, user_id)
+    if user is None:
+        user = Model.query.filter(Model.id == user_id, active(role, Model.id)).first()
+        if user is not None:
+            cache.put(role, user)
+    return user
+
+
+def _discard_cached(target):
+    cache = current_app.extensions.get('user_cache')
+    if cache:
+        cache.discard(role_of(target), target.id)
+
+
+def _after_insert(mapper, connection, target):
+    connection.execute(insert(Identity).values(login=login_of(target), role=role_of(target), user_id=target.id))
+
+
+def _after_update(mapper, connection, target):
+    _discard_cached(target)
+    column = LOGIN_COLUMNS[role_of(target)]
+    if db.inspect(target).attrs[column.key].history.has_changes():
+        connection.execute(update(Identity).where(Identity.role == role_of(target), Identity.user_id == target.id)
+                           .values(login=login_of(target)))
+
+
+def _after_delete(mapper, connection, target):
+    _discard_cached(target)
+    connection.execute(delete(Identity).where(Identity.role == role_of(target), Identity.user_id == target.id))
+
+
+def sync_identities():
+    """Backfill identity rows for accounts created before the table existed, and drop stale ones."""
+    # Accounts disabled for removal keep their rows until the job deletes them
+    removing = {(payload['role'], payload['user_id']) for payload in
+                map(json.loads, db.session.scalars(select(Job.payload).where(Job.kind == 'remove_account')))}
+    for role, Model in ROLE_MODELS.items():
+        known = select(Identity.user_id).where(Identity.role == role)
+        disabled = [user_id for removing_role, user_id in removing if removing_role == role]
+        db.session.execute(insert(Identity).from_select(
+            ['login', 'role', 'user_id'],
+            select(LOGIN_COLUMNS[role], literal(role), Model.id).where(Model.id.not_in(known), Model.id.not_in(disabled))))
+        db.session.execute(delete(Identity).where(Identity.role == role, Identity.user_id.not_in(select(Model.id))))
+    db.session.commit()
+
+
+def init_identity(app):
+    app.extensions['user_cache'] = UserCache(ttl=app.config.get('IDENTITY_CACHE_TTL', 60))
+    for Model in ROLE_MODELS.values():
+        if not event.contains(Model, 'after_insert', _after_insert):
+            event.listen(Model, 'after_insert', _after_insert)
+            event.listen(Model, 'after_update', _after_update)
+            event.listen(Model, 'after_delete', _after_delete)
@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import g, request, has_request_context, request_started, request_finished, \
+    before_render_template, template_rendered
+from sqlalchemy import event
+from models import db
+
+slow_query_log = logging.getLogger('hms.slow_sql')
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Per-endpoint request statistics, rendered in the Prometheus text format."""
+
+    HISTOGRAMS = {
+        'request_duration_seconds': ('Request wall time', SECONDS_BUCKETS, 'wall'),
+        'sql_duration_seconds': ('Time spent in SQL per request', SECONDS_BUCKETS, 'sql_time'),
+        'render_duration_seconds': ('Time spent rendering templates per request', SECONDS_BUCKETS, 'render_time'),
+        'sql_queries': ('SQL statements executed per request', QUERY_BUCKETS, 'queries'),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {name: defaultdict(lambda b=buckets: Histogram(b))
+                            for name, (_, buckets, _) in self.HISTOGRAMS.items()}
+        self._requests = defaultdict(int)
+        self._slow_queries = defaultdict(int)
+        self._observers = []
+
+    def observe(self, endpoint, status, stats):
+        with self._lock:
+            for name, (_, _, field) in self.HISTOGRAMS.items():
+                self._histograms[name][endpoint].observe(stats[field])
+            self._requests[endpoint, status] += 1
+            observers = list(self._observers)
+        for observer in observers:
+            observer(endpoint, stats)
+
+    def add_observer(self, observer):
+        with self._lock:
+            self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        with self._lock:
+            self._observers.remove(observer)
+
+    def slow_query(self, endpoint):
+        with self._lock:
+            self._slow_queries[endpoint] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets, _) in self.HISTOGRAMS.items():
+                lines += [f'# HELP hms_{name} {help_text}', f'# TYPE hms_{name} histogram']
+                for endpoint, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, n in zip(list(buckets) + ['+Inf'], histogram.counts):
+                        cumulative += n
+                        lines.append(f'hms_{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                    lines.append(f'hms_{name}_sum{{endpoint="{endpoint}"}} {histogram.sum:.6f}')
+                    lines.append(f'hms_{name}_count{{endpoint="{endpoint}"}} {histogram.count}')
+            lines += ['# HELP hms_requests_total Requests by endpoint and status', '# TYPE hms_requests_total counter']
+            lines += [f'hms_requests_total{{endpoint="{endpoint}",status="{status}"}} {n}'
+                      for (endpoint, status), n in sorted(self._requests.items())]
+            lines += ['# HELP hms_slow_queries_total Statements slower than SLOW_QUERY_MS', '# TYPE hms_slow_queries_total counter']
+            lines += [f'hms_slow_queries_total{{endpoint="{endpoint}"}} {n}' for endpoint, n in sorted(self._slow_queries.items())]
+        return '\n'.join(lines) + '\n'
+
+
+def _request_stats():
+    if not has_request_context():
+        return None
+    if 'perf' not in g:
+        g.perf = {'started': time.perf_counter(), 'queries': 0, 'sql_time': 0.0, 'render_time': 0.0, 'render_depth': 0}
+    return g.perf
+
+
+def init_instrumentation(app):
+    metrics = app.extensions['metrics'] = Metrics()
+    slow_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        stats = _request_stats()
+        endpoint = request.endpoint if stats is not None else None
+        if stats is not None:
+            stats['queries'] += 1
+            stats['sql_time'] += elapsed
+        if elapsed >= slow_seconds:
+            metrics.slow_query(endpoint or '-')
+            slow_query_log.warning('%.1f ms [%s] %s %r', elapsed * 1000, endpoint or '-', statement, parameters)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        started = exception_context.connection.info.get('query_started') if exception_context.connection else None
+        if started:
+            started.pop()
+
+    def on_request_started(sender, **extra):
+        _request_stats()
+
+    def on_before_render(sender, template, context, **extra):
+        stats = _request_stats()
+        if stats is not None:
+            if stats['render_depth'] == 0:
+                stats['render_started'] = time.perf_counter()
+            stats['render_depth'] += 1
+
+    def on_rendered(sender, template, context, **extra):
+        stats = _request_stats()
+        if stats is not None and stats['render_depth']:
+            stats['render_depth'] -= 1
+            if stats['render_depth'] == 0:
+                stats['render_time'] += time.perf_counter() - stats['render_started']
+
+    def on_request_finished(sender, response, **extra):
+        stats = _request_stats()
+        endpoint = request.endpoint or '-'
+
+        def record():
+            stats['wall'] = time.perf_counter() - stats['started']
+            metrics.observe(endpoint, response.status_code, stats)
+
+        # Streamed bodies (exports, imports) run after this signal; record those
+        # once the server closes the response so their SQL is counted
+        if response.is_streamed:
+            response.call_on_close(record)
+        else:
+            record()
+
+    # Signals hold weak references by default; keep these alive with the app
+    app.extensions['instrumentation_receivers'] = receivers = (
+        on_request_started, on_before_render, on_rendered, on_request_finished)
+    for signal, receiver in zip((request_started, before_render_template, template_rendered, request_finished), receivers):
+        signal.connect(receiver, app)
+
+    return metrics
+
+
+@contextmanager
+def query_budget(app, max_queries, endpoint=None):
+    """Fail if any request made inside the block runs more than `max_queries` statements.
+
+        with query_budget(app, 4):
+            client.get('/admin/view_appointments')
+
+    Streamed responses are counted when closed (`with client.get(...)`).
+    """
+    metrics = app.extensions['metrics']
+    seen = []
+
+    def observer(request_endpoint, stats):
+        if endpoint is None or request_endpoint == endpoint:
+            seen.append((request_endpoint, stats['queries']))
+
+    metrics.add_observer(observer)
+    try:
+        yield seen
+    finally:
+        metrics.remove_observer(observer)
+    over = [(e, n) for e, n in seen if n > max_queries]
+    if over:
+        raise AssertionError(f'query budget of {max_queries} exceeded: {over}')
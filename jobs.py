@@ -0,0 +1,194 @@
+import json
+import logging
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, select, update, or_, and_
+from sqlalchemy.exc import OperationalError
+from models import db, Job
+from database import track_commits, pending
+
+log = logging.getLogger('hms.jobs')
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register a function as the handler for jobs of `kind`; it is called with the payload as keyword arguments.
+
+    Jobs are delivered at least once (a worker that dies mid-job leaves it to be
+    picked up again after the visibility timeout), so handlers must be safe to repeat.
+    """
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, run_at=None, max_attempts=None, **payload):
+    """Add a job to the current session; it is committed, and becomes visible to workers, with the caller's changes."""
+    job = Job(kind=kind, payload=json.dumps(payload), run_at=run_at or datetime.now(),
+              max_attempts=max_attempts or current_app.config.get('JOB_MAX_ATTEMPTS', 5))
+    db.session.add(job)
+    pending('jobs_enqueued').add(kind)
+    return job
+
+
+class JobQueue:
+    """Worker threads that poll the job table, claim due jobs and run their handlers.
+
+    A job is claimed with a conditional UPDATE, so any number of threads or
+    processes can share the table. A claim lasts `visibility_timeout` seconds;
+    failures are retried with exponential backoff until `max_attempts`. Done and
+    failed jobs are deleted `retention_days` after they finished, checked at
+    most every `purge_interval` seconds.
+    """
+
+    def __init__(self, app, workers=2, poll_interval=5, visibility_timeout=300, retry_backoff=30,
+                 retention_days=7, purge_interval=3600):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.retry_backoff = retry_backoff
+        self.retention_days = retention_days
+        self.purge_interval = purge_interval
+        self._purged_at = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def start_once(self):
+        """Start the workers the first time this is called (from the first request)."""
+        if self._started:
+            return
+        with self._start_lock:
+            if not self._started:
+                self._started = True
+                self.start()
+
+    def start(self):
+        for i in range(self.workers - len(self._threads)):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stopping.clear()
+
+    def join(self):
+        for thread in list(self._threads):
+            thread.join()
+
+    def wake(self):
+        self._wake.set()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                ran = self.run_pending()
+            except OperationalError:
+                log.warning('job worker could not reach the database', exc_info=True)
+                ran = 0
+            except Exception:
+                # Keep the thread alive; nothing restarts a worker that exits
+                log.exception('job worker error')
+                ran = 0
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def run_pending(self, limit=None):
+        """Run due jobs until none are left (or `limit` have run); returns how many ran."""
+        ran = 0
+        with self.app.app_context():
+            while limit is None or ran < limit:
+                job = self._claim()
+                if job is None:
+                    break
+                self._run(job)
+                ran += 1
+            if self._purged_at is None or time.monotonic() - self._purged_at >= self.purge_interval:
+                self._purged_at = time.monotonic()
+                self.purge_finished()
+        return ran
+
+    def purge_finished(self, batch_size=None):
+        """Delete done and failed jobs that finished over `retention_days` ago; returns how many went."""
+        batch_size = batch_size or current_app.config.get('JOB_DELETE_BATCH', 200)
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        # run_at precedes finished_at, so bounding it lets ix_job_status_run_at find the rows
+        finished = and_(Job.status.in_(('done', 'failed')), Job.run_at < cutoff, Job.finished_at < cutoff)
+        deleted = 0
+        while True:
+            ids = db.session.scalars(select(Job.id).where(finished).limit(batch_size)).all()
+            if not ids:
+                return deleted
+            db.session.execute(delete(Job).where(Job.id.in_(ids)))
+            db.session.commit()
+            deleted += len(ids)
+
+    def _claim(self):
+        now = datetime.now()
+        due = or_(and_(Job.status == 'pending', Job.run_at <= now),
+                  and_(Job.status == 'running', Job.locked_until < now))
+        for job_id in db.session.scalars(db.select(Job.id).where(due).order_by(Job.run_at).limit(5)):
+            claimed = db.session.execute(
+                update(Job).where(Job.id == job_id, due)
+                .values(status='running', attempts=Job.attempts + 1,
+                        locked_until=now + timedelta(seconds=self.visibility_timeout))
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        return None
+
+    def _run(self, job):
+        func = HANDLERS.get(job.kind)
+        try:
+            if func is None:
+                raise LookupError(f'no handler for job kind {job.kind!r}')
+            func(**json.loads(job.payload))
+        except Exception:
+            db.session.rollback()
+            job = db.session.get(Job, job.id)
+            job.last_error = traceback.format_exc(limit=5)
+            if job.attempts >= job.max_attempts:
+                job.status, job.finished_at = 'failed', datetime.now()
+                log.error('job %s (%s) failed after %d attempts', job.id, job.kind, job.attempts)
+            else:
+                job.status = 'pending'
+                job.run_at = datetime.now() + timedelta(seconds=self.retry_backoff * 2 ** (job.attempts - 1))
+                log.warning('job %s (%s) failed, retrying at %s', job.id, job.kind, job.run_at)
+        else:
+            job.status, job.finished_at, job.last_error = 'done', datetime.now(), None
+        db.session.commit()
+
+
+def _wake_workers(kinds):
+    queue = current_app.extensions.get('jobs')
+    if queue:
+        queue.wake()
+
+
+def init_jobs(app):
+    queue = app.extensions['jobs'] = JobQueue(
+        app, workers=app.config.get('JOB_WORKERS', 2), poll_interval=app.config.get('JOB_POLL_INTERVAL', 5),
+        visibility_timeout=app.config.get('JOB_VISIBILITY_TIMEOUT', 300),
+        retry_backoff=app.config.get('JOB_RETRY_BACKOFF', 30), retention_days=app.config.get('JOB_RETENTION_DAYS', 7),
+        purge_interval=app.config.get('JOB_PURGE_INTERVAL', 3600))
+    track_commits('jobs_enqueued', _wake_workers)
+    return queue
+
+
+def get_jobs():
+    return current_app.extensions['jobs']
@@ -0,0 +1,226 @@
+import logging
+import re
+from datetime import date, datetime
+from sqlalchemy import event, func, insert, select, text, MetaData
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.exc import IntegrityError
+from models import (db, Admin, Department, Doctor, DoctorAvailability, Appointment, CalendarDay, CalendarSlot,
+                    ArchivedAppointment, DailyAppointmentStats)
+from identity import sync_identities
+from search import ensure_search_index
+from reports import rebuild_rollups
+import queries
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DEPARTMENTS = ['Cardiology', 'Neurology', 'Oncology', 'Pediatrics', 'Orthopedics', 'Dermatology']
+RESOLVE_CONFLICTS = 'Resolve these rows (e.g. cancel the duplicate bookings) and run `flask upgrade-db` again.'
+
+
+class UpgradeError(Exception):
+    """Existing rows stop the schema from being upgraded; the message lists them."""
+
+
+def setup_database(seed=True):
+    """Create missing tables and indexes, backfill the derived tables and, with `seed`, add the default admin and departments.
+
+    Every step only adds what is missing, so this is safe to run on each deploy.
+    The app factory does no database I/O; run this once (`flask init-db`)
+    before starting the workers. Returns the names of the indexes created.
+    """
+    db.create_all()
+    upgrade_appointment_ids()
+    created = upgrade_indexes()
+    sync_identities()
+    ensure_search_index()
+    if not db.session.query(DailyAppointmentStats.id).first():
+        rebuild_rollups()
+    if seed:
+        if not Admin.query.filter_by(username='admin').first():
+            admin_user = Admin(username='admin')
+            admin_user.set_password('admin123')
+            db.session.add(admin_user)
+        if Department.query.count() == 0:
+            db.session.add_all([Department(name=name) for name in DEFAULT_DEPARTMENTS])
+    db.session.commit()
+    return created
+
+
+def upgrade_appointment_ids(engine=None):
+    """Rebuild an SQLite appointment table created without AUTOINCREMENT; returns True if it was rebuilt.
+
+    Without it SQLite hands out max(id) + 1, so once the newest live rows are
+    deleted new bookings would reuse ids still held by archived appointments.
+    The sequence is started past the highest live or archived id. Rows that
+    break a unique index raise UpgradeError before anything is changed; the
+    unique indexes themselves are left to `upgrade_indexes`.
+    """
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        return False
+    table = Appointment.__table__
+    # pysqlite does not put DDL inside its implicit transaction, so drive
+    # BEGIN/COMMIT by hand: a failed rebuild must leave the old table untouched
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            rebuilt = _rebuild_without_reuse(conn, table)
+            highest = max(conn.scalar(select(func.max(Appointment.id))) or 0,
+                          conn.scalar(select(func.max(ArchivedAppointment.id))) or 0)
+            if not conn.execute(text("UPDATE sqlite_sequence SET seq = max(seq, :seq) WHERE name = :name"),
+                                {'seq': highest, 'name': table.name}).rowcount:
+                conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                             {'seq': highest, 'name': table.name})
+        except BaseException:
+            conn.exec_driver_sql('ROLLBACK')
+            raise
+        conn.exec_driver_sql('COMMIT')
+    if rebuilt:
+        log.info('Rebuilt %s with AUTOINCREMENT ids', table.name)
+    return rebuilt
+
+
+def _rebuild_without_reuse(conn, table):
+    schema = conn.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                         {'name': table.name})
+    if 'AUTOINCREMENT' in schema.upper():
+        return False
+    conflicts = [_describe_conflicts(conn, index) for index in table.indexes
+                 if index.unique and _conflicting_rows(conn, index)]
+    if conflicts:
+        raise UpgradeError('\n'.join(conflicts + [RESOLVE_CONFLICTS]))
+    scratch = MetaData()
+    for other in db.metadata.sorted_tables:
+        other.to_metadata(scratch, name=f'{table.name}_rebuild' if other is table else None)
+    rebuild = scratch.tables[f'{table.name}_rebuild']
+    columns = [column.name for column in table.columns]
+    conn.exec_driver_sql(f'DROP TABLE IF EXISTS {rebuild.name}')
+    conn.execute(CreateTable(rebuild))
+    conn.execute(insert(rebuild).from_select(columns, select(*table.columns)))
+    conn.exec_driver_sql(f'DROP TABLE {table.name}')
+    conn.exec_driver_sql(f'ALTER TABLE {rebuild.name} RENAME TO {table.name}')
+    for index in table.indexes:
+        if not index.unique:
+            index.create(conn)
+    return True
+
+
+def upgrade_indexes(engine=None):
+    """Create any index declared on the models that an existing database is missing.
+
+    `create_all` skips tables that already exist, so databases created before an
+    index was added never get it. Safe to run on every start. The other indexes
+    are still created when a unique index cannot be, then UpgradeError lists the
+    conflicting rows: booking relies on uq_appointment_active_slot to turn away
+    double bookings, so the app must not run until they are resolved.
+    """
+    engine = engine or db.engine
+    created, conflicts = [], []
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with engine.begin() as conn:
+                    if not _index_exists(conn, index):
+                        index.create(conn)
+                        created.append(index.name)
+            except IntegrityError:
+                with engine.connect() as conn:
+                    conflicts.append(_describe_conflicts(conn, index))
+    if conflicts:
+        raise UpgradeError('\n'.join(conflicts + [RESOLVE_CONFLICTS]))
+    return created
+
+
+def _conflicting_rows(conn, index, limit=20):
+    """Groups of rows sharing the columns of unique `index`, with their counts."""
+    columns = list(index.columns)
+    where = index.dialect_options[conn.dialect.name].get('where') if conn.dialect.name in ('sqlite', 'postgresql') else None
+    query = select(*columns, func.count()).group_by(*columns).having(func.count() > 1).limit(limit)
+    if where is not None:
+        query = query.where(where)
+    return conn.execute(query).all()
+
+
+def _describe_conflicts(conn, index):
+    lines = [f'Could not create unique index {index.name} on {index.table.name}; rows share '
+             f'({", ".join(c.name for c in index.columns)}):']
+    lines += [f'  {", ".join(str(value) for value in row[:-1])}  ({row[-1]} rows)' for row in _conflicting_rows(conn, index)]
+    return '\n'.join(lines)
+
+
+def _index_exists(conn, index):
+    return index.name in {i['name'] for i in db.inspect(conn).get_indexes(index.table.name)}
+
+
+# ---------------------------------------------------------------------------
+# Query-plan check for the hot paths
+# ---------------------------------------------------------------------------
+
+class _Captured(Exception):
+    def __init__(self, statement, parameters):
+        self.statement, self.parameters = statement, parameters
+
+
+def _capture(statement):
+    """Return the SQL and DBAPI parameters for `statement` without running it."""
+    def intercept(conn, cursor, sql, parameters, context, executemany):
+        raise _Captured(sql, parameters)
+
+    with db.engine.connect() as conn:
+        event.listen(conn, 'before_cursor_execute', intercept)
+        try:
+            conn.execute(statement)
+        except _Captured as captured:
+            return captured.statement, captured.parameters
+        finally:
+            event.remove(conn, 'before_cursor_execute', intercept)
+
+
+def explain(statement):
+    sql, parameters = _capture(statement)
+    with db.engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, parameters)]
+
+
+def hot_queries():
+    today = date.today()
+    day_start, day_end = queries.day_range(today)
+    return {
+        'doctor dashboard': queries.doctor_day_appointments(1, today).statement,
+        'slot engine appointments': db.select(Appointment.doctor_id, Appointment.appointment_datetime).where(
+            Appointment.doctor_id.in_([1, 2, 3]),
+            Appointment.appointment_datetime >= day_start,
+            Appointment.appointment_datetime < day_end,
+            Appointment.status != 'Cancelled'),
+        'slot engine availability': db.select(DoctorAvailability).where(DoctorAvailability.doctor_id.in_([1, 2, 3])),
+        'availability by day': db.select(DoctorAvailability).filter_by(doctor_id=1, day_of_week='Monday'),
+        'patient upcoming': queries.patient_upcoming(1, datetime.now()).statement,
+        'patient history': queries.patient_history(1).statement,
+        'doctor patient history': queries.doctor_patient_history(1, 1).statement,
+        'admin appointments page': queries.appointment_listing().limit(51).statement,
+        'archived patient history': queries.patient_history(1, ArchivedAppointment).statement,
+        'archived doctor patient history': queries.doctor_patient_history(1, 1, ArchivedAppointment).statement,
+        'archived appointments page': queries.appointment_listing(ArchivedAppointment).limit(51).statement,
+        'doctors by department': db.select(Doctor).filter_by(specialization_id=1),
+        'slot calendar days': db.select(CalendarDay.doctor_id, CalendarDay.day).where(
+            CalendarDay.doctor_id.in_([1, 2, 3]), CalendarDay.day >= today, CalendarDay.day <= today),
+        'slot calendar free slots': db.select(CalendarSlot.doctor_id, CalendarSlot.slot_datetime).where(
+            CalendarSlot.doctor_id.in_([1, 2, 3]),
+            CalendarSlot.slot_datetime >= day_start,
+            CalendarSlot.slot_datetime < day_end,
+            CalendarSlot.is_booked.is_(False)),
+    }
+
+
+_FULL_SCAN = re.compile(r'^SCAN \w+(?!\w| USING)')
+
+
+def check_query_plans():
+    """EXPLAIN every hot query; returns [(name, plan lines, uses_index)]."""
+    if db.engine.dialect.name != 'sqlite':
+        return []
+    report = []
+    for name, statement in hot_queries().items():
+        plan = explain(statement)
+        report.append((name, plan, not any(map(_FULL_SCAN.match, plan))))
+    return report
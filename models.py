@@ -1,50 +1,48 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import time
+from passwords import hash_password, verify_password
 
 db = SQLAlchemy()
 
-class Admin(db.Model, UserMixin):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
-
+class PasswordMixin:
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
-class Doctor(db.Model, UserMixin):
+class Admin(db.Model, UserMixin, PasswordMixin):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    password_hash = db.Column(db.String(256))
+
+class Doctor(db.Model, UserMixin, PasswordMixin):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    specialization_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
+    specialization_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False, index=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone = db.Column(db.String(20))
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     appointments = db.relationship('Appointment', backref='doctor', lazy=True, cascade="all, delete-orphan")
     availability = db.relationship('DoctorAvailability', backref='doctor', lazy=True, cascade="all, delete-orphan")
 
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
-class Patient(db.Model, UserMixin):
+class Patient(db.Model, UserMixin, PasswordMixin):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone = db.Column(db.String(20))
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     appointments = db.relationship('Appointment', backref='patient', lazy=True, cascade="all, delete-orphan")
 
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+class Identity(db.Model):
+    # One row per account so login can resolve role and id with a single indexed lookup.
+    # `login` is the admin username or the doctor/patient email.
+    __table_args__ = (db.UniqueConstraint('role', 'user_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    login = db.Column(db.String(120), nullable=False, index=True)
+    role = db.Column(db.String(10), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
 
 class Department(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -55,11 +53,23 @@ class Department(db.Model):
         return self.name
 
 class Appointment(db.Model):
+    __table_args__ = (
+        db.Index('ix_appointment_doctor_datetime', 'doctor_id', 'appointment_datetime'),
+        db.Index('ix_appointment_patient_datetime', 'patient_id', 'appointment_datetime'),
+        db.Index('ix_appointment_datetime_id', 'appointment_datetime', 'id'),
+        db.Index('ix_appointment_status', 'status'),
+        # One active booking per doctor and time; cancelled rows free the slot again
+        db.Index('uq_appointment_active_slot', 'doctor_id', 'appointment_datetime', unique=True,
+                 sqlite_where=db.text("status != 'Cancelled'"), postgresql_where=db.text("status != 'Cancelled'")),
+        # Never reuse an id: archived appointments keep theirs (see archive.py)
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
     appointment_datetime = db.Column(db.DateTime, nullable=False)
-    status = db.Column(db.String(20), nullable=False, default='Booked')
+    # active_history: the stats, calendar and report hooks read the old status even if it was expired
+    status = db.mapped_column(db.String(20), nullable=False, default='Booked', active_history=True)
     treatment = db.relationship('Treatment', backref='appointment', uselist=False, cascade="all, delete-orphan")
 
 class Treatment(db.Model):
@@ -69,8 +79,87 @@ class Treatment(db.Model):
     prescription = db.Column(db.Text, nullable=False)
 
 class DoctorAvailability(db.Model):
+    __table_args__ = (
+        db.Index('ix_availability_doctor_day', 'doctor_id', 'day_of_week'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
     day_of_week = db.Column(db.String(10), nullable=False)
     start_time = db.Column(db.Time, nullable=False, default=time(9, 0))
-    end_time = db.Column(db.Time, nullable=False, default=time(17, 0))
\ No newline at end of file
+    end_time = db.Column(db.Time, nullable=False, default=time(17, 0))
+
+class CalendarDay(db.Model):
+    # A (doctor, day) whose slots are materialized in calendar_slot, built with `slot_minutes`
+    __table_args__ = (db.UniqueConstraint('doctor_id', 'day'),)
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    slot_minutes = db.Column(db.Integer, nullable=False)
+
+class CalendarSlot(db.Model):
+    __table_args__ = (
+        db.Index('uq_calendar_slot_doctor_datetime', 'doctor_id', 'slot_datetime', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    slot_datetime = db.Column(db.DateTime, nullable=False)
+    is_booked = db.Column(db.Boolean, nullable=False, default=False)
+
+class Job(db.Model):
+    # Background work queued in the same transaction as the change that caused it (see jobs.py)
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False)
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    finished_at = db.Column(db.DateTime)
+
+class ArchivedAppointment(db.Model):
+    # Completed and cancelled appointments moved out of the hot table by archive.py.
+    # Rows keep their original id, so they can be listed alongside live appointments.
+    __table_args__ = (
+        db.Index('ix_archived_appointment_patient_datetime', 'patient_id', 'appointment_datetime'),
+        db.Index('ix_archived_appointment_doctor_datetime', 'doctor_id', 'appointment_datetime'),
+        db.Index('ix_archived_appointment_datetime_id', 'appointment_datetime', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    appointment_datetime = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    patient = db.relationship('Patient')
+    doctor = db.relationship('Doctor')
+    treatment = db.relationship('ArchivedTreatment', uselist=False, cascade="all, delete-orphan")
+
+class ArchivedTreatment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('archived_appointment.id'), nullable=False, unique=True)
+    diagnosis = db.Column(db.Text, nullable=False)
+    prescription = db.Column(db.Text, nullable=False)
+
+class DailyAppointmentStats(db.Model):
+    # Per doctor and day appointment counts by status, live and archived together (see reports.py)
+    __table_args__ = (db.UniqueConstraint('day', 'doctor_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+
+class DataVersion(db.Model):
+    # Change counters for cached API responses, bumped in the same transaction as the change (see http_cache.py)
+    __table_args__ = (db.UniqueConstraint('topic', 'scope'),)
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(20), nullable=False)
+    scope = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
\ No newline at end of file
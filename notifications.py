@@ -0,0 +1,134 @@
+import logging
+import threading
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from models import db, Doctor, Patient, Appointment, ArchivedAppointment
+from jobs import handler, enqueue
+
+log = logging.getLogger('hms.notifications')
+
+Message = namedtuple('Message', 'channel to subject body sent_at')
+
+
+class LogSink:
+    """Stand-in for an email/SMS gateway: logs each message and keeps the most recent ones in memory."""
+
+    def __init__(self, keep=500):
+        self._lock = threading.Lock()
+        self.sent = deque(maxlen=keep)
+
+    def send(self, channel, to, subject, body):
+        message = Message(channel, to, subject, body, datetime.now())
+        with self._lock:
+            self.sent.append(message)
+        log.info('[%s] to %s: %s - %s', channel, to, subject, body)
+
+
+def _notify(user, subject, body):
+    sink = current_app.extensions['notification_sink']
+    sink.send('email', user.email, subject, body)
+    if user.phone:
+        sink.send('sms', user.phone, subject, body)
+
+
+def _load(appointment_id):
+    return Appointment.query.options(joinedload(Appointment.patient), joinedload(Appointment.doctor))\
+        .filter_by(id=appointment_id).first()
+
+
+def _when(appointment):
+    return appointment.appointment_datetime.strftime('%A %d %B %Y at %H:%M')
+
+
+# ---------------------------------------------------------------------------
+# Enqueued by the request handlers, in the same transaction as the change
+# ---------------------------------------------------------------------------
+
+def appointment_booked(appointment):
+    enqueue('booking_confirmation', appointment_id=appointment.id)
+    remind_at = appointment.appointment_datetime - timedelta(days=1)
+    if remind_at > datetime.now():
+        enqueue('appointment_reminder', run_at=remind_at, appointment_id=appointment.id)
+
+
+def appointment_cancelled(appointment, by):
+    enqueue('cancellation_notice', appointment_id=appointment.id, cancelled_by=by)
+
+
+def account_removed(role, user_id):
+    enqueue('remove_account', role=role, user_id=user_id)
+
+
+# ---------------------------------------------------------------------------
+# Handlers
+# ---------------------------------------------------------------------------
+
+@handler('booking_confirmation')
+def send_booking_confirmation(appointment_id):
+    appointment = _load(appointment_id)
+    if appointment is None or appointment.status != 'Booked':
+        return
+    _notify(appointment.patient, 'Appointment confirmed',
+            f'Your appointment with Dr. {appointment.doctor.name} is booked for {_when(appointment)}.')
+
+
+@handler('appointment_reminder')
+def send_reminder(appointment_id):
+    appointment = _load(appointment_id)
+    # Cancelled or rescheduled since the reminder was queued
+    if appointment is None or appointment.status != 'Booked' or appointment.appointment_datetime < datetime.now():
+        return
+    _notify(appointment.patient, 'Appointment reminder',
+            f'Reminder: you see Dr. {appointment.doctor.name} on {_when(appointment)}.')
+
+
+@handler('cancellation_notice')
+def send_cancellation_notice(appointment_id, cancelled_by):
+    appointment = _load(appointment_id)
+    if appointment is None or appointment.status != 'Cancelled':
+        return
+    recipient = appointment.doctor if cancelled_by == 'patient' else appointment.patient
+    _notify(recipient, 'Appointment cancelled',
+            f'The appointment between {appointment.patient.name} and Dr. {appointment.doctor.name} '
+            f'on {_when(appointment)} has been cancelled.')
+
+
+@handler('remove_account')
+def remove_account(role, user_id):
+    """Delete an account's appointments and treatments, live and archived, in batches, then the account itself.
+
+    Each batch is its own commit so the database is never locked for the whole
+    cascade; patients with upcoming visits are told when a doctor is removed.
+    """
+    Model = Doctor if role == 'doctor' else Patient
+    batch_size = current_app.config.get('JOB_DELETE_BATCH', 200)
+    user = db.session.get(Model, user_id)
+    if user is None:
+        return
+    if role == 'doctor':
+        upcoming = Appointment.query.options(joinedload(Appointment.patient))\
+            .filter(Appointment.doctor_id == user_id, Appointment.status == 'Booked', Appointment.appointment_datetime >= datetime.now())
+        for appointment in upcoming:
+            _notify(appointment.patient, 'Appointment cancelled',
+                    f'Dr. {user.name} is no longer available, so your appointment on {_when(appointment)} '
+                    f'has been cancelled. Please book another time.')
+    for Stored in (Appointment, ArchivedAppointment):
+        column = Stored.doctor_id if role == 'doctor' else Stored.patient_id
+        while True:
+            batch = Stored.query.options(joinedload(Stored.treatment))\
+                .filter(column == user_id).order_by(Stored.id).limit(batch_size).all()
+            if not batch:
+                break
+            for appointment in batch:
+                db.session.delete(appointment)
+            db.session.commit()
+    db.session.delete(user)
+    db.session.commit()
+    # Session events only count live appointments
+    current_app.extensions['stats'].invalidate()
+
+
+def init_notifications(app):
+    app.extensions['notification_sink'] = LogSink()
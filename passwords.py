@@ -0,0 +1,62 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+def _method():
+    return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD) if has_app_context() else DEFAULT_METHOD
+
+
+def _run(func, *args):
+    # Hashes go through a small bounded pool so a burst of logins can only keep
+    # PASSWORD_HASH_WORKERS cores busy; other requests still get scheduled.
+    pool = current_app.extensions.get('password_pool') if has_app_context() else None
+    if pool is None:
+        return func(*args)
+    return pool.submit(func, *args).result()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, _method())
+
+
+def verify_password(pwhash, password):
+    # A stored hash werkzeug cannot parse is a failed match, not a server error
+    try:
+        return bool(pwhash) and _run(check_password_hash, pwhash, password)
+    except ValueError:
+        return False
+
+
+def is_verifiable(pwhash):
+    """True if `pwhash` is a werkzeug 'method$salt$hash' string with a method check_password_hash accepts."""
+    if pwhash.count('$') < 2:
+        return False
+    method, *args = pwhash.split('$', 1)[0].split(':')
+    if method == 'scrypt':
+        return len(args) <= 3 and all(arg.isdigit() for arg in args)
+    if method == 'pbkdf2':
+        return (len(args) <= 2 and (not args or args[0] in hashlib.algorithms_available)
+                and all(arg.isdigit() for arg in args[1:]))
+    return False
+
+
+@lru_cache(maxsize=16)
+def _canonical_prefix(method):
+    # werkzeug fills in defaults (e.g. 'pbkdf2' -> 'pbkdf2:sha256:600000'), so
+    # take the prefix from a real hash rather than the configured string
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(pwhash):
+    """True when a stored hash was made with a different method or cost than configured."""
+    return pwhash.split('$', 1)[0] != _canonical_prefix(_method())
+
+
+def init_passwords(app):
+    app.extensions['password_pool'] = ThreadPoolExecutor(max_workers=app.config.get('PASSWORD_HASH_WORKERS', 4),
+                                                         thread_name_prefix='password-hash')
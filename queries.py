@@ -0,0 +1,140 @@
+import heapq
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import joinedload, contains_eager
+from models import Doctor, Patient, Department, Appointment, ArchivedAppointment
+
+# Listing queries for the admin, doctor and patient pages. Every relationship a
+# template touches is loaded up front so a page costs the same number of queries
+# whatever the row count.
+
+
+def _with_doctor(Model=Appointment):
+    return joinedload(Model.doctor).joinedload(Doctor.department)
+
+
+def appointment_listing(Model=Appointment):
+    return Model.query.options(joinedload(Model.patient), _with_doctor(Model))\
+        .order_by(Model.appointment_datetime.desc(), Model.id.desc())
+
+
+def doctor_listing():
+    return Doctor.query.join(Department).options(contains_eager(Doctor.department))
+
+
+def patient_listing():
+    return Patient.query
+
+
+def day_range(day):
+    # Half-open [midnight, next midnight) so the filter can use the datetime indexes
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def doctor_day_appointments(doctor_id, day):
+    day_start, day_end = day_range(day)
+    return Appointment.query.options(joinedload(Appointment.patient), joinedload(Appointment.treatment))\
+        .filter(Appointment.doctor_id == doctor_id,
+                Appointment.appointment_datetime >= day_start,
+                Appointment.appointment_datetime < day_end)\
+        .order_by(Appointment.appointment_datetime)
+
+
+def patient_upcoming(patient_id, now=None):
+    return Appointment.query.options(_with_doctor())\
+        .filter(Appointment.patient_id == patient_id, Appointment.appointment_datetime >= (now or datetime.now()))\
+        .order_by(Appointment.appointment_datetime)
+
+
+def patient_history(patient_id, Model=Appointment):
+    return Model.query.options(_with_doctor(Model), joinedload(Model.treatment))\
+        .filter(Model.patient_id == patient_id)\
+        .order_by(Model.appointment_datetime.desc(), Model.id.desc())
+
+
+def doctor_patient_history(patient_id, doctor_id, Model=Appointment):
+    return Model.query.options(joinedload(Model.treatment))\
+        .filter(Model.patient_id == patient_id, Model.doctor_id == doctor_id)\
+        .order_by(Model.appointment_datetime.desc(), Model.id.desc())
+
+
+# Old finished appointments live in archived_appointment (see archive.py); these
+# read the live and archived tables and merge them newest first.
+
+def _newest_first(*row_lists):
+    return list(heapq.merge(*row_lists, key=lambda a: (a.appointment_datetime, a.id), reverse=True))
+
+
+def full_patient_history(patient_id):
+    return _newest_first(*(patient_history(patient_id, Model).all() for Model in (Appointment, ArchivedAppointment)))
+
+
+def full_doctor_patient_history(patient_id, doctor_id):
+    return _newest_first(*(doctor_patient_history(patient_id, doctor_id, Model).all()
+                           for Model in (Appointment, ArchivedAppointment)))
+
+
+# Keyset pagination: a page is the next `per_page` rows after the cursor of the
+# previous page's last row, so deep pages cost the same as the first one.
+Page = namedtuple('Page', 'items next_cursor')
+
+
+def _page(query, per_page, cursor_of):
+    rows = query.limit(per_page + 1).all()
+    next_cursor = cursor_of(rows[per_page - 1]) if len(rows) > per_page else None
+    return Page(rows[:per_page], next_cursor)
+
+
+def appointment_cursor(appointment):
+    return f'{appointment.appointment_datetime.isoformat()}~{appointment.id}'
+
+
+def decode_appointment_cursor(cursor):
+    try:
+        dt_str, id_str = cursor.split('~')
+        return datetime.fromisoformat(dt_str), int(id_str)
+    except (AttributeError, ValueError):
+        return None
+
+
+def appointment_page(after=None, per_page=50):
+    # One keyset page from each table, merged; archived rows keep their ids so the cursor spans both
+    position = decode_appointment_cursor(after)
+    row_lists = []
+    for Model in (Appointment, ArchivedAppointment):
+        query = appointment_listing(Model)
+        if position:
+            after_dt, after_id = position
+            query = query.filter(or_(Model.appointment_datetime < after_dt,
+                                     and_(Model.appointment_datetime == after_dt, Model.id < after_id)))
+        row_lists.append(query.limit(per_page + 1).all())
+    rows = _newest_first(*row_lists)[:per_page + 1]
+    next_cursor = appointment_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    return Page(rows[:per_page], next_cursor)
+
+
+def doctor_page(after=None, per_page=50):
+    query = doctor_listing().order_by(Doctor.id)
+    if after:
+        query = query.filter(Doctor.id > after)
+    return _page(query, per_page, lambda doctor: doctor.id)
+
+
+def patient_page(after=None, per_page=50):
+    query = patient_listing().order_by(Patient.id)
+    if after:
+        query = query.filter(Patient.id > after)
+    return _page(query, per_page, lambda patient: patient.id)
+
+
+def iter_pages(page_func, batch_size=500, **kwargs):
+    """Yield every row of a paged listing, holding at most one batch in memory."""
+    after = None
+    while True:
+        page = page_func(after=after, per_page=batch_size, **kwargs)
+        yield from page.items
+        if page.next_cursor is None:
+            return
+        after = page.next_cursor
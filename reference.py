@@ -0,0 +1,75 @@
+import threading
+import time
+from flask import current_app
+from sqlalchemy import select
+from models import db, Doctor, Department
+from http_cache import current_versions
+from identity import active
+
+TOPICS = ('doctors', 'departments')
+
+
+class ReferenceData:
+    """Departments and the doctors in each, as (id, name) pairs for select fields.
+
+    Loaded with two queries on first use. Every read first compares the
+    database-backed doctor and department versions (see http_cache.py), so a
+    doctor added, edited or removed by any process is picked up on the next
+    read. Reloads also happen after `ttl` seconds, for changes made outside
+    the app.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._departments = ()
+        self._doctors = {}
+        self._loaded_at = None
+        self._versions = None
+
+    def departments(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._departments
+
+    def doctors(self, dept_id):
+        try:
+            dept_id = int(dept_id)
+        except (TypeError, ValueError):
+            return ()
+        with self._lock:
+            self._ensure_loaded()
+            return self._doctors.get(dept_id, ())
+
+    def load(self):
+        with self._lock:
+            self._load()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self):
+        versions = current_versions(TOPICS)
+        if self._loaded_at is None or versions != self._versions or time.monotonic() - self._loaded_at > self.ttl:
+            self._load()
+            self._versions = versions
+
+    def _load(self):
+        departments = tuple(tuple(row) for row in
+                            db.session.execute(select(Department.id, Department.name).order_by(Department.id)))
+        doctors = {dept_id: [] for dept_id, _ in departments}
+        for doctor_id, name, dept_id in db.session.query(Doctor.id, Doctor.name, Doctor.specialization_id)\
+                .filter(active('doctor', Doctor.id)).order_by(Doctor.id):
+            doctors.setdefault(dept_id, []).append((doctor_id, name))
+        self._departments = departments
+        self._doctors = {dept_id: tuple(rows) for dept_id, rows in doctors.items()}
+        self._loaded_at = time.monotonic()
+
+
+def init_reference(app):
+    app.extensions['reference'] = ReferenceData(ttl=app.config.get('REFERENCE_CACHE_TTL', 300))
+
+
+def get_reference():
+    return current_app.extensions['reference']
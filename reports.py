@@ -0,0 +1,178 @@
+from collections import Counter, defaultdict
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import event, select, insert, delete, update, union_all, func, case
+from models import db, Doctor, Department, DoctorAvailability, Appointment, ArchivedAppointment, DailyAppointmentStats
+from slots import slot_minutes
+from database import insert_ignore
+
+# Daily rollups for the admin reports. daily_appointment_stats holds one row per
+# doctor and day with appointment counts by status, covering live and archived
+# appointments. Mapper events keep it current as appointments are booked,
+# change status or are deleted; `flask rebuild-reports` recomputes it with a
+# GROUP BY after bulk changes. Reports aggregate the rollups, never appointments.
+
+Stats = DailyAppointmentStats
+STATUS_COLUMNS = {'Completed': 'completed', 'Cancelled': 'cancelled', 'Booked': 'booked'}
+
+
+def _source(start=None, end=None):
+    """(doctor_id, day, status) for every live and archived appointment in [start, end]."""
+    branches = []
+    for Model in (Appointment, ArchivedAppointment):
+        query = select(Model.doctor_id, func.date(Model.appointment_datetime).label('day'), Model.status)
+        if start:
+            query = query.where(Model.appointment_datetime >= datetime.combine(start, time.min))
+        if end:
+            query = query.where(Model.appointment_datetime < datetime.combine(end + timedelta(days=1), time.min))
+        branches.append(query)
+    return union_all(*branches).subquery()
+
+
+def rebuild_rollups(start=None, end=None):
+    """Recompute the rollups for [start, end] (everything by default) in one transaction; returns the row count."""
+    source = _source(start, end)
+    counts = [func.count()] + [func.sum(case((source.c.status == status, 1), else_=0))
+                               for status in STATUS_COLUMNS]
+    aggregate = select(source.c.day, source.c.doctor_id, *counts).group_by(source.c.day, source.c.doctor_id)
+    stale = delete(Stats)
+    if start:
+        stale = stale.where(Stats.day >= start)
+    if end:
+        stale = stale.where(Stats.day <= end)
+    db.session.execute(stale)
+    rows = db.session.execute(insert(Stats).from_select(
+        ['day', 'doctor_id', 'total'] + list(STATUS_COLUMNS.values()), aggregate)).rowcount
+    db.session.commit()
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------------------------------
+
+def _count(connection, doctor_id, when, status, sign):
+    day = when.date()
+    values = {'total': Stats.total + sign}
+    if status in STATUS_COLUMNS:
+        column = STATUS_COLUMNS[status]
+        values[column] = getattr(Stats, column) + sign
+    change = update(Stats).where(Stats.day == day, Stats.doctor_id == doctor_id).values(**values)
+    if not connection.execute(change).rowcount:
+        connection.execute(insert_ignore(connection, Stats), {'day': day, 'doctor_id': doctor_id, 'total': 0,
+                                                              **{c: 0 for c in STATUS_COLUMNS.values()}})
+        connection.execute(change)
+
+
+def _inserted(mapper, connection, target):
+    _count(connection, target.doctor_id, target.appointment_datetime, target.status, 1)
+
+
+def _updated(mapper, connection, target):
+    history = db.inspect(target).attrs.status.history
+    if history.deleted and history.added and history.deleted[0] != history.added[0]:
+        # Moves one appointment between status columns; the total is unchanged
+        day = target.appointment_datetime.date()
+        values = {}
+        for status, sign in ((history.deleted[0], -1), (history.added[0], 1)):
+            if status in STATUS_COLUMNS:
+                column = STATUS_COLUMNS[status]
+                values[column] = getattr(Stats, column) + sign
+        if values:
+            connection.execute(update(Stats).where(Stats.day == day, Stats.doctor_id == target.doctor_id)
+                               .values(**values))
+
+
+def _deleted(mapper, connection, target):
+    _count(connection, target.doctor_id, target.appointment_datetime, target.status, -1)
+
+
+def _doctor_deleted(mapper, connection, target):
+    connection.execute(delete(Stats).where(Stats.doctor_id == target.id))
+
+
+def init_reports(app):
+    if event.contains(Appointment, 'after_insert', _inserted):
+        return
+    event.listen(Appointment, 'after_insert', _inserted)
+    event.listen(Appointment, 'after_update', _updated)
+    for Model in (Appointment, ArchivedAppointment):
+        event.listen(Model, 'after_delete', _deleted)
+    event.listen(Doctor, 'before_delete', _doctor_deleted)
+
+
+# ---------------------------------------------------------------------------
+# Reports
+# ---------------------------------------------------------------------------
+
+def _group_columns(group):
+    if group == 'department':
+        return Department.id, Department.name
+    return Doctor.id, Doctor.name
+
+
+def _from_rollups(*columns, group, start, end):
+    group_id, group_name = _group_columns(group)
+    return select(group_id.label('id'), group_name.label('name'), *columns)\
+        .select_from(Stats).join(Doctor, Doctor.id == Stats.doctor_id)\
+        .join(Department, Department.id == Doctor.specialization_id)\
+        .where(Stats.day >= start, Stats.day <= end)
+
+
+def daily_appointments(start, end, group='doctor'):
+    """Appointments per doctor or department per day, split by status."""
+    query = _from_rollups(Stats.day, func.sum(Stats.total), func.sum(Stats.completed), func.sum(Stats.cancelled),
+                          func.sum(Stats.booked), group=group, start=start, end=end)
+    group_id = _group_columns(group)[0]
+    rows = db.session.execute(query.group_by(Stats.day, group_id).order_by(Stats.day, group_id))
+    return [{'day': str(day), 'id': id_, 'name': name, 'total': total, 'completed': completed,
+             'cancelled': cancelled, 'booked': booked}
+            for id_, name, day, total, completed, cancelled, booked in rows]
+
+
+def _ratio(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def rates(start, end, group='doctor', today=None):
+    """Cancellation and no-show rates per doctor or department.
+
+    A no-show is an appointment on a past day still marked Booked; the no-show
+    rate is taken over the past days' appointments that were not cancelled.
+    """
+    today = today or date.today()
+    past = Stats.day < today
+    query = _from_rollups(func.sum(Stats.total), func.sum(Stats.cancelled),
+                          func.sum(case((past, Stats.booked), else_=0)),
+                          func.sum(case((past, Stats.total - Stats.cancelled), else_=0)),
+                          group=group, start=start, end=end)
+    group_id = _group_columns(group)[0]
+    return [{'id': id_, 'name': name, 'total': total, 'cancelled': cancelled, 'no_shows': no_shows,
+             'cancellation_rate': _ratio(cancelled, total), 'no_show_rate': _ratio(no_shows, attended)}
+            for id_, name, total, cancelled, no_shows, attended
+            in db.session.execute(query.group_by(group_id).order_by(group_id))]
+
+
+def occupancy(start, end, group='doctor'):
+    """Active appointments against the slots DoctorAvailability offers over the range."""
+    weekdays = Counter((start + timedelta(days=i)).strftime('%A') for i in range((end - start).days + 1))
+    minutes = slot_minutes()
+    capacity = Counter()
+    for availability in DoctorAvailability.query:
+        window = (availability.start_time.hour * 60 + availability.start_time.minute,
+                  availability.end_time.hour * 60 + availability.end_time.minute)
+        slots = len(range(window[0], window[1], minutes))
+        capacity[availability.doctor_id] += slots * weekdays[availability.day_of_week]
+
+    booked = dict(db.session.execute(
+        select(Stats.doctor_id, func.sum(Stats.total - Stats.cancelled))
+        .where(Stats.day >= start, Stats.day <= end).group_by(Stats.doctor_id)).all())
+    group_id, group_name = _group_columns(group)
+    groups = defaultdict(lambda: {'slots': 0, 'booked': 0})
+    names = {}
+    for doctor_id, id_, name in db.session.execute(
+            select(Doctor.id, group_id, group_name).join(Department, Department.id == Doctor.specialization_id)):
+        names[id_] = name
+        groups[id_]['slots'] += capacity[doctor_id]
+        groups[id_]['booked'] += booked.get(doctor_id, 0)
+    return [{'id': id_, 'name': names[id_], 'slots': g['slots'], 'booked': g['booked'],
+             'occupancy': _ratio(g['booked'], g['slots'])} for id_, g in sorted(groups.items())]
@@ -0,0 +1,231 @@
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import joinedload
+from models import db, Doctor, Patient
+from queries import Page
+
+# Doctors and patients share one index; the rowid encodes which table a row
+# belongs to so lookups and deletes by primary key never scan the index.
+KINDS = {'doctor': 0, 'patient': 1}
+MODELS = {'doctor': Doctor, 'patient': Patient}
+
+
+def _rowid(kind, ref_id):
+    return ref_id * 2 + KINDS[kind]
+
+
+def _kind_of(target):
+    return 'doctor' if isinstance(target, Doctor) else 'patient'
+
+
+def _tokens(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _fields(target, connection):
+    department = ''
+    if isinstance(target, Doctor):
+        # Only use an already-loaded relationship; lazy loading is not allowed mid-flush
+        loaded = target.__dict__.get('department')
+        if loaded is not None:
+            department = loaded.name
+        else:
+            department = connection.execute(text('SELECT name FROM department WHERE id = :id'),
+                                            {'id': target.specialization_id}).scalar() or ''
+    return {'ident': str(target.id), 'name': target.name, 'phone': target.phone or '',
+            'email': target.email, 'department': department}
+
+
+class FTSBackend:
+    """SQLite FTS5 table ranked with bm25, maintained from mapper events."""
+
+    name = 'fts5'
+    CREATE = ("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+              "ident, name, phone, email, department, tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+
+    def ensure(self):
+        db.session.execute(text(self.CREATE))
+        indexed = db.session.execute(text('SELECT count(*) FROM search_index')).scalar()
+        expected = db.session.query(db.func.count(Doctor.id)).scalar() + db.session.query(db.func.count(Patient.id)).scalar()
+        if indexed != expected:
+            self.rebuild()
+        db.session.commit()
+
+    def rebuild(self):
+        db.session.execute(text('DELETE FROM search_index'))
+        db.session.execute(text(
+            "INSERT INTO search_index(rowid, ident, name, phone, email, department) "
+            "SELECT doctor.id * 2, doctor.id, doctor.name, coalesce(doctor.phone, ''), doctor.email, department.name "
+            "FROM doctor JOIN department ON department.id = doctor.specialization_id"))
+        db.session.execute(text(
+            "INSERT INTO search_index(rowid, ident, name, phone, email, department) "
+            "SELECT id * 2 + 1, id, name, coalesce(phone, ''), email, '' FROM patient"))
+
+    def upsert(self, connection, kind, target):
+        self.remove(connection, kind, target.id)
+        connection.execute(text('INSERT INTO search_index(rowid, ident, name, phone, email, department) '
+                                'VALUES (:rowid, :ident, :name, :phone, :email, :department)'),
+                           dict(_fields(target, connection), rowid=_rowid(kind, target.id)))
+
+    def remove(self, connection, kind, ref_id):
+        connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': _rowid(kind, ref_id)})
+
+    def search(self, kind, query, offset, limit):
+        match = ' '.join(f'"{token}"*' for token in _tokens(query))
+        rows = db.session.execute(text(
+            'SELECT rowid FROM search_index WHERE search_index MATCH :match AND rowid % 2 = :kind '
+            'ORDER BY rank LIMIT :limit OFFSET :offset'),
+            {'match': match, 'kind': KINDS[kind], 'limit': limit, 'offset': offset})
+        return [rowid // 2 for rowid, in rows]
+
+
+class TrigramBackend:
+    """In-process trigram index, used when FTS5 is unavailable.
+
+    Built on first search and kept current by the same mapper events, so
+    changes made by other worker processes are only seen after a restart or
+    `flask rebuild-search`.
+    """
+
+    name = 'trigram'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = None
+        self._postings = defaultdict(set)
+
+    def ensure(self):
+        # Rebuilt lazily on the next search
+        with self._lock:
+            self._docs = None
+
+    def rebuild(self):
+        with self._lock:
+            self._docs, self._postings = {}, defaultdict(set)
+            doctors = Doctor.query.options(joinedload(Doctor.department))
+            for kind, rows in (('doctor', doctors), ('patient', Patient.query)):
+                for row in rows:
+                    self._add(kind, row.id, _fields(row, None))
+
+    @staticmethod
+    def _trigrams(word):
+        return {word[i:i + 3] for i in range(len(word) - 2)}
+
+    def _add(self, kind, ref_id, fields):
+        words = _tokens(' '.join(fields.values()))
+        key = (kind, ref_id)
+        self._docs[key] = words
+        for word in words:
+            for gram in self._trigrams(word):
+                self._postings[gram].add(key)
+
+    def _remove(self, key):
+        for word in self._docs.pop(key, ()):
+            for gram in self._trigrams(word):
+                self._postings[gram].discard(key)
+
+    def upsert(self, connection, kind, target):
+        with self._lock:
+            if self._docs is not None:
+                self._remove((kind, target.id))
+                self._add(kind, target.id, _fields(target, connection))
+
+    def remove(self, connection, kind, ref_id):
+        with self._lock:
+            if self._docs is not None:
+                self._remove((kind, ref_id))
+
+    def search(self, kind, query, offset, limit):
+        if self._docs is None:
+            self.rebuild()
+        tokens = _tokens(query)
+        with self._lock:
+            candidates = None
+            for token in tokens:
+                grams = self._trigrams(token)
+                if grams:
+                    found = set.intersection(*(self._postings.get(g, set()) for g in grams))
+                    candidates = found if candidates is None else candidates & found
+            if candidates is None:
+                candidates = self._docs.keys()
+            scored = []
+            for key in candidates:
+                if key[0] != kind:
+                    continue
+                words = self._docs[key]
+                # Every token must prefix some word; whole-word matches rank higher
+                score = 0
+                for token in tokens:
+                    best = max((2 if word == token else 1 for word in words if word.startswith(token)), default=0)
+                    if not best:
+                        break
+                    score += best
+                else:
+                    scored.append((-score, key[1]))
+        scored.sort()
+        return [ref_id for _, ref_id in scored[offset:offset + limit]]
+
+
+def _sqlite_has_fts5():
+    # FTS5 is a property of the linked SQLite library, so probe a throwaway
+    # in-memory database rather than opening the app's
+    connection = sqlite3.connect(':memory:')
+    try:
+        return connection.execute("SELECT 1 FROM pragma_compile_options WHERE compile_options = 'ENABLE_FTS5'")\
+            .fetchone() is not None
+    finally:
+        connection.close()
+
+
+def _choose_backend(app):
+    choice = app.config.get('SEARCH_BACKEND', 'auto')
+    if choice == 'auto':
+        choice = 'fts5' if make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name() == 'sqlite' \
+            and _sqlite_has_fts5() else 'trigram'
+    return FTSBackend() if choice == 'fts5' else TrigramBackend()
+
+
+def _backend():
+    return current_app.extensions['search']
+
+
+def _after_save(mapper, connection, target):
+    _backend().upsert(connection, _kind_of(target), target)
+
+
+def _after_delete(mapper, connection, target):
+    _backend().remove(connection, _kind_of(target), target.id)
+
+
+def init_search(app):
+    app.extensions['search'] = _choose_backend(app)
+    for Model in MODELS.values():
+        if not event.contains(Model, 'after_insert', _after_save):
+            event.listen(Model, 'after_insert', _after_save)
+            event.listen(Model, 'after_update', _after_save)
+            event.listen(Model, 'after_delete', _after_delete)
+
+
+def ensure_search_index():
+    _backend().ensure()
+
+
+def rebuild_search_index():
+    _backend().rebuild()
+    db.session.commit()
+
+
+def search_page(kind, query, offset=None, per_page=50):
+    """Ranked prefix search over name, phone, email and department, paged by offset."""
+    offset = offset or 0
+    ids = _backend().search(kind, query, offset, per_page + 1) if _tokens(query) else []
+    Model = MODELS[kind]
+    rows = Model.query.options(joinedload(Doctor.department)) if kind == 'doctor' else Model.query
+    by_id = {row.id: row for row in rows.filter(Model.id.in_(ids[:per_page]))} if ids else {}
+    items = [by_id[i] for i in ids[:per_page] if i in by_id]
+    return Page(items, offset + per_page if len(ids) > per_page else None)
@@ -0,0 +1,228 @@
+from calendar import monthrange
+from collections import defaultdict
+from datetime import datetime, date, time, timedelta
+from flask import current_app
+from sqlalchemy import event, insert, delete, select, update, bindparam, exists
+from sqlalchemy.exc import IntegrityError
+from models import db, Doctor, DoctorAvailability, Appointment, CalendarDay, CalendarSlot
+from slots import slot_grid, slot_minutes, compute_slots
+from identity import active
+
+# Materialized slot calendar: every slot of each doctor's next SLOT_CALENDAR_DAYS
+# days is a calendar_slot row with a booked flag. Days are built lazily on first
+# read, bookings and cancellations flip single rows from mapper events, and an
+# availability change drops the affected weekdays so they are rebuilt. Days
+# before today are dropped whenever a doctor's calendar is extended.
+
+
+def _horizon_days():
+    return current_app.config.get('SLOT_CALENDAR_DAYS', 60)
+
+
+def lookup_limit():
+    """The last date slots can be looked up for; later dates never have any."""
+    return date.today() + timedelta(days=current_app.config.get('SLOT_LOOKUP_DAYS', 365))
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def ensure_materialized(doctor_ids, start_date, end_date):
+    """Build any (doctor, day) in the range that is missing or was built with another slot length."""
+    minutes = slot_minutes()
+    built = set(db.session.query(CalendarDay.doctor_id, CalendarDay.day).filter(
+        CalendarDay.doctor_id.in_(doctor_ids), CalendarDay.day >= start_date, CalendarDay.day <= end_date,
+        CalendarDay.slot_minutes == minutes))
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    missing = defaultdict(list)
+    for doctor_id in doctor_ids:
+        for day in days:
+            if (doctor_id, day) not in built:
+                missing[doctor_id].append(day)
+    if missing:
+        _materialize(missing, minutes)
+
+
+def _materialize(missing, minutes):
+    first = min(day for days in missing.values() for day in days)
+    last = max(day for days in missing.values() for day in days)
+    grid = slot_grid(list(missing), first, last, minutes)
+    day_rows, slot_rows, stale = [], [], []
+    for doctor_id, days in missing.items():
+        for day in days:
+            day_start, day_end = _day_bounds(day)
+            stale.append({'d': doctor_id, 'day': day, 'start': day_start, 'end': day_end})
+            day_rows.append({'doctor_id': doctor_id, 'day': day, 'slot_minutes': minutes})
+            slot_rows += [{'doctor_id': doctor_id, 'slot_datetime': day_start + timedelta(minutes=offset), 'is_booked': booked}
+                          for offset, booked in grid[doctor_id].get(day, ())]
+    today = date.today()
+    # Written on its own connection so a clash with another worker building the
+    # same days never rolls back the caller's session
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(delete(CalendarDay).where(CalendarDay.doctor_id == bindparam('d'), CalendarDay.day == bindparam('day')),
+                         stale)
+            conn.execute(delete(CalendarSlot).where(CalendarSlot.doctor_id == bindparam('d'),
+                                                    CalendarSlot.slot_datetime >= bindparam('start'),
+                                                    CalendarSlot.slot_datetime < bindparam('end')), stale)
+            conn.execute(delete(CalendarDay).where(CalendarDay.doctor_id.in_(list(missing)), CalendarDay.day < today))
+            conn.execute(delete(CalendarSlot).where(CalendarSlot.doctor_id.in_(list(missing)),
+                                                    CalendarSlot.slot_datetime < datetime.combine(today, time.min)))
+            conn.execute(insert(CalendarDay), day_rows)
+            if slot_rows:
+                conn.execute(insert(CalendarSlot), slot_rows)
+                # The grid was read before this transaction; a booking committed
+                # in between would otherwise be written back as free
+                conn.execute(update(CalendarSlot).where(
+                    CalendarSlot.doctor_id == bindparam('d'),
+                    CalendarSlot.slot_datetime >= bindparam('start'),
+                    CalendarSlot.slot_datetime < bindparam('end')
+                ).values(is_booked=exists().where(Appointment.doctor_id == CalendarSlot.doctor_id,
+                                                  Appointment.appointment_datetime == CalendarSlot.slot_datetime,
+                                                  Appointment.status != 'Cancelled')), stale)
+    except IntegrityError:
+        pass
+
+
+def calendar_slots(doctor_ids, start_date, end_date):
+    """Free slots as {doctor_id: {date: ['HH:MM', ...]}}, read from the calendar where it covers the range.
+
+    Ids that are not active doctors get no slots and, since the public APIs pass
+    ids straight through, never get calendar rows written for them.
+    """
+    now = datetime.now()
+    today = now.date()
+    horizon_end = today + timedelta(days=_horizon_days() - 1)
+    result = {doctor_id: {} for doctor_id in doctor_ids}
+    start_date = max(start_date, today)
+    end_date = min(end_date, lookup_limit())
+    if not result or end_date < start_date:
+        return result
+    known = set(db.session.scalars(select(Doctor.id).where(Doctor.id.in_(list(result)), active('doctor', Doctor.id))))
+    doctor_ids = [doctor_id for doctor_id in result if doctor_id in known]
+    if not doctor_ids:
+        return result
+
+    calendar_end = min(end_date, horizon_end)
+    if start_date <= calendar_end:
+        ensure_materialized(doctor_ids, start_date, calendar_end)
+        rows = db.session.query(CalendarSlot.doctor_id, CalendarSlot.slot_datetime).filter(
+            CalendarSlot.doctor_id.in_(doctor_ids),
+            CalendarSlot.slot_datetime >= max(datetime.combine(start_date, time.min), now),
+            CalendarSlot.slot_datetime < datetime.combine(calendar_end + timedelta(days=1), time.min),
+            CalendarSlot.is_booked.is_(False)
+        ).order_by(CalendarSlot.doctor_id, CalendarSlot.slot_datetime)
+        for doctor_id, slot_datetime in rows:
+            result[doctor_id].setdefault(slot_datetime.date(), []).append(slot_datetime.strftime('%H:%M'))
+
+    if end_date > horizon_end:
+        for doctor_id, days in compute_slots(doctor_ids, max(start_date, horizon_end + timedelta(days=1)), end_date).items():
+            result[doctor_id].update(days)
+    return result
+
+
+def get_available_slots(doctor_id, selected_date):
+    try:
+        doctor_id = int(doctor_id)
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(selected_date, date):
+        return []
+    return calendar_slots([doctor_id], selected_date, selected_date)[doctor_id].get(selected_date, [])
+
+
+def month_slots(doctor_id, year, month):
+    first = date(year, month, 1)
+    last = first.replace(day=monthrange(year, month)[1])
+    return {day.isoformat(): times for day, times in calendar_slots([doctor_id], first, last)[doctor_id].items()}
+
+
+def department_slots(dept_id, start_date, days=7):
+    doctors = Doctor.query.filter_by(specialization_id=dept_id).filter(active('doctor', Doctor.id)).order_by(Doctor.id).all()
+    end_date = min(start_date, lookup_limit()) + timedelta(days=days - 1)
+    slots = calendar_slots([d.id for d in doctors], start_date, end_date)
+    return [{
+        'id': d.id,
+        'name': d.name,
+        'slots': {day.isoformat(): times for day, times in sorted(slots[d.id].items())}
+    } for d in doctors]
+
+
+def refresh_calendar(doctor_id):
+    """Rebuild a doctor's calendar for the whole horizon, e.g. after their availability changed."""
+    today = date.today()
+    ensure_materialized([doctor_id], today, today + timedelta(days=_horizon_days() - 1))
+
+
+def clear_calendar(connection=None, doctor_id=None):
+    """Drop materialized days (all of them, or one doctor's); they are rebuilt on the next read."""
+    statements = [delete(CalendarSlot), delete(CalendarDay)]
+    if doctor_id is not None:
+        statements = [delete(CalendarSlot).where(CalendarSlot.doctor_id == doctor_id),
+                      delete(CalendarDay).where(CalendarDay.doctor_id == doctor_id)]
+    if connection is not None:
+        for statement in statements:
+            connection.execute(statement)
+    else:
+        for statement in statements:
+            db.session.execute(statement)
+        db.session.commit()
+
+
+# ---------------------------------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------------------------------
+
+def _set_booked(connection, doctor_id, slot_datetime, booked):
+    connection.execute(update(CalendarSlot)
+                       .where(CalendarSlot.doctor_id == doctor_id, CalendarSlot.slot_datetime == slot_datetime)
+                       .values(is_booked=booked))
+
+
+def _appointment_inserted(mapper, connection, target):
+    if target.status != 'Cancelled':
+        _set_booked(connection, target.doctor_id, target.appointment_datetime, True)
+
+
+def _appointment_updated(mapper, connection, target):
+    history = db.inspect(target).attrs.status.history
+    if history.deleted and history.added:
+        was_active, is_active = history.deleted[0] != 'Cancelled', history.added[0] != 'Cancelled'
+        if was_active != is_active:
+            _set_booked(connection, target.doctor_id, target.appointment_datetime, is_active)
+
+
+def _appointment_deleted(mapper, connection, target):
+    if target.status != 'Cancelled':
+        _set_booked(connection, target.doctor_id, target.appointment_datetime, False)
+
+
+def _availability_changed(mapper, connection, target):
+    # Drop every materialized day of that weekday; the next read rebuilds it
+    today = date.today()
+    horizon = current_app.config.get('SLOT_CALENDAR_DAYS', 60)
+    days = [today + timedelta(days=i) for i in range(horizon)
+            if (today + timedelta(days=i)).strftime('%A') == target.day_of_week]
+    connection.execute(delete(CalendarDay).where(CalendarDay.doctor_id == target.doctor_id, CalendarDay.day.in_(days)))
+    for day in days:
+        day_start, day_end = _day_bounds(day)
+        connection.execute(delete(CalendarSlot).where(CalendarSlot.doctor_id == target.doctor_id,
+                                                      CalendarSlot.slot_datetime >= day_start,
+                                                      CalendarSlot.slot_datetime < day_end))
+
+
+def _doctor_deleted(mapper, connection, target):
+    clear_calendar(connection, target.id)
+
+
+def init_calendar(app):
+    if event.contains(Appointment, 'after_insert', _appointment_inserted):
+        return
+    event.listen(Appointment, 'after_insert', _appointment_inserted)
+    event.listen(Appointment, 'after_update', _appointment_updated)
+    event.listen(Appointment, 'after_delete', _appointment_deleted)
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(DoctorAvailability, name, _availability_changed)
+    event.listen(Doctor, 'before_delete', _doctor_deleted)
@@ -0,0 +1,82 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from flask import current_app
+from models import db, DoctorAvailability, Appointment
+
+DEFAULT_SLOT_MINUTES = 30
+
+
+def slot_minutes():
+    return current_app.config.get('SLOT_MINUTES', DEFAULT_SLOT_MINUTES)
+
+
+@lru_cache(maxsize=256)
+def _window_offsets(start_time, end_time, minutes):
+    # Minute offsets from midnight for every slot that starts inside [start_time, end_time)
+    start = start_time.hour * 60 + start_time.minute
+    end = end_time.hour * 60 + end_time.minute
+    return tuple(range(start, end, minutes))
+
+
+def _date_range(start_date, end_date):
+    return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+def slot_grid(doctor_ids, start_date, end_date, minutes=None):
+    """Every slot in the doctors' availability windows over [start_date, end_date].
+
+    Returns {doctor_id: {date: [(minute offset, booked), ...]}} using exactly two
+    queries no matter how many doctors or days are requested.
+    """
+    doctor_ids = list(doctor_ids)
+    minutes = minutes or slot_minutes()
+    grid = {doctor_id: {} for doctor_id in doctor_ids}
+    if not doctor_ids or end_date < start_date:
+        return grid
+
+    windows = defaultdict(dict)
+    for availability in DoctorAvailability.query.filter(DoctorAvailability.doctor_id.in_(doctor_ids)):
+        windows[availability.doctor_id][availability.day_of_week] = (availability.start_time, availability.end_time)
+
+    # Booked slots per (doctor, date) as a set of minute offsets
+    booked = defaultdict(set)
+    rows = db.session.query(Appointment.doctor_id, Appointment.appointment_datetime).filter(
+        Appointment.doctor_id.in_(doctor_ids),
+        Appointment.appointment_datetime >= datetime.combine(start_date, time.min),
+        Appointment.appointment_datetime < datetime.combine(end_date + timedelta(days=1), time.min),
+        Appointment.status != 'Cancelled'
+    )
+    for doctor_id, appointment_datetime in rows:
+        if appointment_datetime.second or appointment_datetime.microsecond:
+            continue
+        booked[doctor_id, appointment_datetime.date()].add(appointment_datetime.hour * 60 + appointment_datetime.minute)
+
+    days = [(day, day.strftime('%A')) for day in _date_range(start_date, end_date)]
+    for doctor_id in doctor_ids:
+        doctor_windows = windows.get(doctor_id)
+        if not doctor_windows:
+            continue
+        for day, day_name in days:
+            window = doctor_windows.get(day_name)
+            if not window:
+                continue
+            taken = booked.get((doctor_id, day), ())
+            grid[doctor_id][day] = [(offset, offset in taken) for offset in _window_offsets(window[0], window[1], minutes)]
+    return grid
+
+
+def compute_slots(doctor_ids, start_date, end_date, minutes=None, now=None):
+    """Free slots for many doctors over [start_date, end_date] as {doctor_id: {date: ['HH:MM', ...]}}."""
+    now = now or datetime.now()
+    today, now_offset = now.date(), now.hour * 60 + now.minute
+    grid = slot_grid(doctor_ids, max(start_date, today), end_date, minutes)
+    result = {}
+    for doctor_id, days in grid.items():
+        result[doctor_id] = {}
+        for day, slots in days.items():
+            # Slots strictly after the current minute are still bookable today
+            cutoff = now_offset if day == today else -1
+            result[doctor_id][day] = ['%02d:%02d' % divmod(offset, 60) for offset, booked in slots
+                                      if offset > cutoff and not booked]
+    return result
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import Counter
+from flask import current_app
+from sqlalchemy import inspect
+from models import db, Doctor, Patient, Department, Appointment, ArchivedAppointment
+from database import track_commits
+
+
+class DashboardStats:
+    """Row counts for the admin dashboard, kept current by session events.
+
+    Commits adjust the counters in place; a full recount runs whenever the
+    cached figures are older than `ttl` seconds, which also picks up writes
+    made by other processes or by bulk statements that bypass the ORM.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._doctor_departments = {}
+        self._loaded_at = None
+
+    def snapshot(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._recount()
+            counts = self._counts
+            return {
+                'doctors': counts['doctors'],
+                'patients': counts['patients'],
+                'appointments': counts['appointments'],
+                'by_status': {key[1]: n for key, n in counts.items() if isinstance(key, tuple) and key[0] == 'status' and n},
+                'by_department': {key[1]: n for key, n in counts.items() if isinstance(key, tuple) and key[0] == 'department' and n},
+            }
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _recount(self):
+        counts = Counter()
+        counts['doctors'] = db.session.query(db.func.count(Doctor.id)).scalar()
+        counts['patients'] = db.session.query(db.func.count(Patient.id)).scalar()
+        # Archived appointments still count towards the totals
+        for Model in (Appointment, ArchivedAppointment):
+            for status, n in db.session.query(Model.status, db.func.count(Model.id)).group_by(Model.status):
+                counts['status', status] += n
+                counts['appointments'] += n
+            for name, n in db.session.query(Department.name, db.func.count(Model.id))\
+                    .join(Doctor, Doctor.specialization_id == Department.id)\
+                    .join(Model, Model.doctor_id == Doctor.id)\
+                    .group_by(Department.name):
+                counts['department', name] += n
+        self._doctor_departments = {doctor_id: name for doctor_id, name in db.session.query(Doctor.id, Department.name)
+                                    .join(Department, Doctor.specialization_id == Department.id)}
+        self._counts = counts
+        self._loaded_at = time.monotonic()
+
+    def apply(self, deltas, doctors):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._doctor_departments.update((k, v) for k, v in doctors.items() if v is not None)
+            for key, n in deltas.items():
+                if isinstance(key, tuple) and key[0] == 'doctor':
+                    department = self._doctor_departments.get(key[1])
+                    if department is None:
+                        # Doctor created by another process; let the next read recount
+                        self._loaded_at = None
+                        return
+                    key = ('department', department)
+                self._counts[key] += n
+            for doctor_id in [k for k, v in doctors.items() if v is None]:
+                self._doctor_departments.pop(doctor_id, None)
+
+
+def _count_appointment(deltas, appointment, sign):
+    deltas['appointments'] += sign
+    deltas['status', appointment.status] += sign
+    deltas['doctor', appointment.doctor_id] += sign
+
+
+def _collect(session, gathered):
+    if 'stats' not in current_app.extensions:
+        return
+    deltas = gathered.setdefault('deltas', Counter())
+    doctors = gathered.setdefault('doctors', {})
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            _count_appointment(deltas, obj, 1)
+        elif isinstance(obj, Doctor):
+            deltas['doctors'] += 1
+            if obj.department is not None:
+                doctors[obj.id] = obj.department.name
+        elif isinstance(obj, Patient):
+            deltas['patients'] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            _count_appointment(deltas, obj, -1)
+        elif isinstance(obj, Doctor):
+            deltas['doctors'] -= 1
+            doctors[obj.id] = None
+        elif isinstance(obj, Patient):
+            deltas['patients'] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Appointment):
+            history = inspect(obj).attrs.status.history
+            if history.deleted and history.added:
+                deltas['status', history.deleted[0]] -= 1
+                deltas['status', history.added[0]] += 1
+
+
+def _apply(gathered):
+    deltas, doctors = gathered.get('deltas'), gathered.get('doctors')
+    stats = current_app.extensions.get('stats')
+    if stats and (deltas or doctors):
+        stats.apply(deltas or Counter(), doctors or {})
+
+
+def init_stats(app):
+    app.extensions['stats'] = DashboardStats(ttl=app.config.get('STATS_TTL', 300))
+    track_commits('stats', _apply, _collect, factory=dict)
+
+
+def get_stats():
+    return current_app.extensions['stats']
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from benchmarks.hospital import seed_hospital, PASSWORD
+from migrations import setup_database
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'JOB_WORKERS': 0,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    })
+    with app.app_context():
+        setup_database()
+    return app
+
+
+@pytest.fixture
+def hospital(app):
+    """A small synthetic hospital: 4 doctors, 40 patients, a year of appointments."""
+    with app.app_context():
+        return seed_hospital(doctors=4, patients=40, years=1, per_day=3)
+
+
+def login(app, email, password=PASSWORD):
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.status_code == 302, response.status_code
+    return client
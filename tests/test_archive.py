@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+import queries
+from archive import archive_appointments
+from booking import book_slot
+from models import db, Appointment, ArchivedAppointment, Patient
+from stats import get_stats
+
+
+def _history(patient_id):
+    return [(a.id, a.appointment_datetime, a.status) for a in queries.full_patient_history(patient_id)]
+
+
+def test_archive_keeps_history_and_counts(app, hospital):
+    with app.app_context():
+        patient_id = Patient.query.join(Appointment).first().id
+        before, total = _history(patient_id), get_stats().snapshot()['appointments']
+        moved = archive_appointments(older_than_days=90)
+        assert moved and ArchivedAppointment.query.count() == moved
+        assert not Appointment.query.filter(
+            Appointment.appointment_datetime < datetime.now() - timedelta(days=90),
+            Appointment.status.in_(['Completed', 'Cancelled'])).count()
+        assert _history(patient_id) == before
+        get_stats().invalidate()
+        assert get_stats().snapshot()['appointments'] == total
+
+
+def test_ids_are_not_reused_after_archiving(app, hospital):
+    with app.app_context():
+        archive_appointments(older_than_days=90)
+        for appointment in Appointment.query:
+            db.session.delete(appointment)
+        db.session.commit()
+        booked = book_slot(1, 1, datetime.now().replace(microsecond=0, second=0) + timedelta(days=3))
+        assert db.session.get(ArchivedAppointment, booked.id) is None
+        assert booked.id > db.session.query(db.func.max(ArchivedAppointment.id)).scalar()
@@ -0,0 +1,80 @@
+import io
+import json
+
+from werkzeug.security import generate_password_hash
+
+from bulk import import_stream
+from identity import authenticate
+from models import db, Patient
+
+HASH = generate_password_hash('secret-password', 'pbkdf2:sha256:1000')
+
+
+def run_import(kind, text, fmt='csv', batch_size=2):
+    errors = import_stream(kind, io.StringIO(text), fmt, batch_size=batch_size, processes=1)
+    rejected = []
+    while True:
+        try:
+            rejected.append(next(errors))
+        except StopIteration as done:
+            return done.value, dict(rejected)
+
+
+def patient(i, **fields):
+    return {'name': f'Imported {i}', 'email': f'imported{i}@example.com', 'phone': f'555000{i:04d}',
+            'password_hash': HASH, **fields}
+
+
+def csv_text(rows):
+    columns = list(rows[0])
+    return '\n'.join([','.join(columns)] + [','.join(str(row[c]) for c in columns) for row in rows]) + '\n'
+
+
+def test_invalid_rows_are_reported_by_line(app):
+    rows = [patient(0), patient(1, phone='123'), patient(2, name=''), patient(3, email='not-an-email'),
+            patient(4, password_hash='md5$x$y')]
+    with app.app_context():
+        inserted, rejected = run_import('patients', csv_text(rows))
+        assert inserted == 1
+        assert set(rejected) == {3, 4, 5, 6}
+        assert 'phone' in rejected[3] and 'name' in rejected[4] and 'email' in rejected[5]
+        assert 'password_hash' in rejected[6]
+        assert Patient.query.count() == 1
+
+
+def test_duplicate_emails_within_and_across_batches(app):
+    rows = [patient(0), patient(0), patient(1), patient(2), patient(1)]
+    with app.app_context():
+        db.session.add(Patient(name='Existing', email='imported2@example.com', phone='5550009999', password_hash=HASH))
+        db.session.commit()
+        inserted, rejected = run_import('patients', csv_text(rows))
+        # Line 3 repeats line 2 in the same batch, line 6 repeats line 4 from an earlier batch
+        # and line 5 is already in the database
+        assert inserted == 2
+        assert set(rejected) == {3, 5, 6}
+        assert all('already exists' in message for message in rejected.values())
+
+
+def test_jsonl_lines_that_are_not_objects(app):
+    lines = [json.dumps(patient(0)), '[1, 2]', '"text"', '{"name": ', json.dumps(patient(1))]
+    with app.app_context():
+        inserted, rejected = run_import('patients', '\n'.join(lines) + '\n', fmt='jsonl')
+        assert inserted == 2
+        assert rejected[2] == rejected[3] == 'expected a JSON object'
+        assert rejected[4].startswith('invalid JSON')
+
+
+def test_imported_passwords_are_hashed(app):
+    row = patient(0)
+    del row['password_hash']
+    row['password'] = 'imported-password'
+    with app.app_context():
+        assert run_import('patients', csv_text([row])) == (1, {})
+        assert authenticate(row['email'], 'imported-password')[1] == 'patient'
+
+
+def test_unparseable_stored_hash_fails_login(app):
+    with app.app_context():
+        db.session.add(Patient(name='Legacy', email='legacy@example.com', phone='5550001111', password_hash='md5$x$y'))
+        db.session.commit()
+        assert authenticate('legacy@example.com', 'anything') == (None, None)
@@ -0,0 +1,53 @@
+from datetime import date, datetime, time, timedelta
+
+from booking import book_slot
+from models import db, CalendarDay, Doctor
+from slot_calendar import calendar_slots, get_available_slots, refresh_calendar
+from slots import compute_slots
+
+
+def test_calendar_matches_computed_slots(app, hospital):
+    with app.app_context():
+        doctor_ids = [d.id for d in Doctor.query]
+        start, end = date.today(), date.today() + timedelta(days=13)
+        assert calendar_slots(doctor_ids, start, end) == compute_slots(doctor_ids, start, end)
+
+
+def test_booking_and_cancelling_update_the_calendar(app, hospital):
+    with app.app_context():
+        day = date.today() + timedelta(days=2)
+        doctor_id = next(d.id for d in Doctor.query if get_available_slots(d.id, day))
+        hour, minute = map(int, get_available_slots(doctor_id, day)[0].split(':'))
+        appointment = book_slot(1, doctor_id, datetime.combine(day, time(hour, minute)))
+        assert f'{hour:02d}:{minute:02d}' not in get_available_slots(doctor_id, day)
+        appointment.status = 'Cancelled'
+        db.session.commit()
+        assert f'{hour:02d}:{minute:02d}' in get_available_slots(doctor_id, day)
+
+
+def test_past_days_are_pruned(app, hospital):
+    with app.app_context():
+        db.session.add(CalendarDay(doctor_id=1, day=date.today() - timedelta(days=5), slot_minutes=30))
+        db.session.commit()
+        refresh_calendar(1)
+        assert not CalendarDay.query.filter(CalendarDay.doctor_id == 1, CalendarDay.day < date.today()).count()
+
+
+def test_unknown_doctors_get_no_calendar(app, hospital):
+    client = app.test_client()
+    month = (date.today() + timedelta(days=1)).strftime('%Y-%m')
+    for doctor_id in (999, 1000):
+        assert client.get(f'/api/available_slots/{doctor_id}/month/{month}').json == {}
+        assert client.get(f'/api/available_slots/{doctor_id}/{date.today() + timedelta(days=1)}').json == []
+    with app.app_context():
+        assert not CalendarDay.query.filter(CalendarDay.doctor_id >= 999).count()
+
+
+def test_dates_past_the_lookup_limit(app, hospital):
+    client = app.test_client()
+    for url in ('/api/available_slots/1/9999-12-31', '/api/available_slots/1/month/9999-12',
+                '/api/available_slots/department/1/9999-12-31'):
+        assert client.get(url).status_code == 400, url
+    with app.app_context():
+        assert get_available_slots(1, date.max) == []
+        assert calendar_slots([1], date.today(), date.max)[1]
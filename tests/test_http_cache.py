@@ -0,0 +1,26 @@
+from datetime import date, datetime, time, timedelta
+
+from app import create_app
+from booking import book_slot
+from models import Doctor
+from slot_calendar import get_available_slots
+
+
+def test_booking_in_another_worker_invalidates_cached_slots(app, hospital):
+    # A second app on the same database stands in for another worker process
+    other = create_app({'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'], 'JOB_WORKERS': 0})
+    with app.app_context():
+        day = date.today() + timedelta(days=2)
+        doctor_id = next(d.id for d in Doctor.query if get_available_slots(d.id, day))
+    url = f'/api/available_slots/{doctor_id}/{day.isoformat()}'
+    client = app.test_client()
+    first = client.get(url)
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    hour, minute = map(int, first.json[0].split(':'))
+    with other.app_context():
+        book_slot(1, doctor_id, datetime.combine(day, time(hour, minute)))
+
+    second = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert first.json[0] not in second.json
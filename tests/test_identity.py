@@ -0,0 +1,47 @@
+from identity import authenticate, load_identity, sync_identities
+from jobs import get_jobs
+from models import db, Appointment, Doctor, Job
+from benchmarks.hospital import PASSWORD
+from conftest import login
+
+
+def test_login_for_each_role(app, hospital):
+    with app.app_context():
+        assert authenticate('admin', 'admin123')[1] == 'admin'
+        assert authenticate('doctor0@example.com', PASSWORD)[1] == 'doctor'
+        assert authenticate('patient0@example.com', PASSWORD)[1] == 'patient'
+        assert authenticate('patient0@example.com', 'wrong') == (None, None)
+
+
+def test_cached_user_is_dropped_on_change(app, hospital):
+    with app.app_context():
+        doctor = load_identity('doctor', 1)
+        db.session.get(Doctor, 1).name = 'Renamed Doctor'
+        db.session.commit()
+        db.session.remove()
+        assert load_identity('doctor', 1).name == 'Renamed Doctor'
+        doctor = db.session.get(Doctor, 1)
+        doctor.email = 'renamed@example.com'
+        db.session.commit()
+        assert authenticate('renamed@example.com', PASSWORD)[0].id == 1
+        assert authenticate('doctor0@example.com', PASSWORD) == (None, None)
+
+
+def test_removed_doctor_is_disabled_before_the_job_runs(app, hospital):
+    doctor = login(app, 'doctor0@example.com')
+    admin = login(app, 'admin', 'admin123')
+    with app.app_context():
+        dept_id = db.session.get(Doctor, 1).specialization_id
+    assert any(d['id'] == 1 for d in admin.get(f'/api/doctors_by_department/{dept_id}').json)
+    for _ in range(2):
+        assert admin.post('/admin/remove/doctor/1').status_code == 302
+    assert doctor.get('/doctor/dashboard').status_code == 302
+    assert all(d['id'] != 1 for d in admin.get(f'/api/doctors_by_department/{dept_id}').json)
+    with app.app_context():
+        assert authenticate('doctor0@example.com', PASSWORD) == (None, None)
+        assert Job.query.filter_by(kind='remove_account').count() == 1
+        sync_identities()
+        assert authenticate('doctor0@example.com', PASSWORD) == (None, None)
+        get_jobs().run_pending()
+        assert db.session.get(Doctor, 1) is None
+        assert not Appointment.query.filter_by(doctor_id=1).count()
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+from jobs import handler, enqueue, get_jobs, JobQueue
+from models import db, Job
+
+calls = []
+
+
+@handler('test_echo')
+def echo(value):
+    calls.append(value)
+
+
+@handler('test_fail')
+def fail():
+    raise RuntimeError('boom')
+
+
+def test_enqueued_job_runs_after_commit(app):
+    calls.clear()
+    with app.app_context():
+        enqueue('test_echo', value=1)
+        db.session.rollback()
+        enqueue('test_echo', value=2)
+        db.session.commit()
+        assert get_jobs().run_pending() == 1
+        assert calls == [2]
+        assert Job.query.one().status == 'done'
+
+
+def test_job_waits_for_run_at(app):
+    with app.app_context():
+        enqueue('test_echo', run_at=datetime.now() + timedelta(hours=1), value=3)
+        db.session.commit()
+        assert get_jobs().run_pending() == 0
+
+
+def test_failing_job_is_retried_then_failed(app):
+    with app.app_context():
+        queue = get_jobs()
+        queue.retry_backoff = 0
+        enqueue('test_fail', max_attempts=2)
+        db.session.commit()
+        queue.run_pending()
+        job = db.session.get(Job, 1)
+        db.session.refresh(job)
+        assert (job.status, job.attempts) == ('failed', 2)
+        assert 'boom' in job.last_error
+
+
+
+def test_finished_jobs_are_purged_after_retention(app):
+    with app.app_context():
+        queue = get_jobs()
+        old = datetime.now() - timedelta(days=queue.retention_days + 1)
+        db.session.add_all([Job(kind='test_echo', status=status, run_at=old, finished_at=old)
+                            for status in ('done', 'failed')])
+        db.session.add(Job(kind='test_echo', status='running', run_at=old, locked_until=datetime.now() + timedelta(hours=1)))
+        enqueue('test_echo', value=4)
+        db.session.commit()
+        assert queue.run_pending() == 1
+        assert sorted(job.status for job in Job.query) == ['done', 'running']
+
+
+def test_worker_survives_unexpected_errors(app, monkeypatch):
+    queue = JobQueue(app, workers=1, poll_interval=0)
+    results = iter([RuntimeError('boom'), 0])
+
+    def run_pending():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        queue._stopping.set()
+        return result
+    monkeypatch.setattr(queue, 'run_pending', run_pending)
+    queue._work()
+    assert next(results, None) is None
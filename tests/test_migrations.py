@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from migrations import upgrade_indexes, UpgradeError
+from models import db, Appointment
+
+# The appointment table as the first release created it: no AUTOINCREMENT, no indexes
+BASELINE_APPOINTMENT = """
+CREATE TABLE appointment (
+    id INTEGER NOT NULL,
+    patient_id INTEGER NOT NULL,
+    doctor_id INTEGER NOT NULL,
+    appointment_datetime DATETIME NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(patient_id) REFERENCES patient (id),
+    FOREIGN KEY(doctor_id) REFERENCES doctor (id)
+)"""
+
+
+def test_duplicate_bookings_stop_the_upgrade(app, hospital):
+    when = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=30)
+    with app.app_context():
+        db.session.execute(text('DROP INDEX uq_appointment_active_slot'))
+        db.session.add_all([Appointment(patient_id=patient_id, doctor_id=1, appointment_datetime=when)
+                            for patient_id in (1, 2)])
+        db.session.commit()
+        with pytest.raises(UpgradeError, match='uq_appointment_active_slot') as failure:
+            upgrade_indexes()
+        assert '(2 rows)' in str(failure.value)
+
+        # Cancelling one of the pair lets the index be created
+        Appointment.query.filter_by(doctor_id=1, appointment_datetime=when, patient_id=2).one().status = 'Cancelled'
+        db.session.commit()
+        assert upgrade_indexes() == ['uq_appointment_active_slot']
+
+
+def test_upgrade_db_command_fails_on_conflicts(app, hospital):
+    with app.app_context():
+        db.session.execute(text('DROP INDEX uq_appointment_active_slot'))
+        first = Appointment.query.filter(Appointment.status != 'Cancelled').first()
+        db.session.add(Appointment(patient_id=first.patient_id, doctor_id=first.doctor_id,
+                                   appointment_datetime=first.appointment_datetime))
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['upgrade-db'])
+    assert result.exit_code != 0
+    assert 'uq_appointment_active_slot' in result.output
+
+
+def test_legacy_table_with_duplicate_bookings(app):
+    with app.app_context():
+        db.session.execute(text('DROP TABLE appointment'))
+        db.session.execute(text(BASELINE_APPOINTMENT))
+        db.session.execute(text("INSERT INTO appointment (patient_id, doctor_id, appointment_datetime, status) "
+                                "VALUES (1, 1, '2030-01-07 10:00:00', 'Booked'), (2, 1, '2030-01-07 10:00:00', 'Booked')"))
+        db.session.commit()
+    runner = app.test_cli_runner()
+    for _ in range(2):
+        # A failed upgrade leaves nothing behind, so it fails the same way again
+        result = runner.invoke(args=['upgrade-db'])
+        assert result.exit_code != 0
+        assert 'uq_appointment_active_slot' in result.output and '2030-01-07 10:00:00  (2 rows)' in result.output
+
+    with app.app_context():
+        db.session.execute(text("UPDATE appointment SET status = 'Cancelled' WHERE patient_id = 2"))
+        db.session.commit()
+    result = runner.invoke(args=['upgrade-db'])
+    assert result.exit_code == 0, result.output
+    assert 'uq_appointment_active_slot' in result.output
+    with app.app_context():
+        schema = db.session.scalar(text("SELECT sql FROM sqlite_master WHERE name = 'appointment'"))
+        assert 'AUTOINCREMENT' in schema.upper()
+        assert Appointment.query.count() == 2
@@ -0,0 +1,77 @@
+"""Listing pages must run a fixed number of statements however many rows they show."""
+import html
+import re
+
+import pytest
+
+from instrumentation import query_budget
+from models import Appointment, Patient
+from conftest import login
+
+ADMIN_PAGES = [
+    ('/admin/dashboard', 3),
+    ('/admin/view_doctors', 2),
+    ('/admin/view_doctors?query=cardio', 2),
+    ('/admin/view_patients', 2),
+    ('/admin/view_patients?query=patient1', 2),
+    ('/admin/view_appointments', 2),
+    ('/api/chart_data/admin', 2),
+]
+
+
+@pytest.mark.parametrize('url, budget', ADMIN_PAGES)
+def test_admin_listings(app, hospital, url, budget):
+    client = login(app, 'admin', 'admin123')
+    client.get(url)  # warm the user and reference caches
+    with query_budget(app, budget) as seen:
+        assert client.get(url).status_code == 200
+    assert seen
+
+
+def test_admin_appointment_pages(app, hospital):
+    client = login(app, 'admin', 'admin123')
+    client.get('/admin/view_appointments')
+    with query_budget(app, 2, endpoint='view_appointments') as seen:
+        page = client.get('/admin/view_appointments')
+        for _ in range(3):
+            next_url = re.search(r'href="(/admin/view_appointments\?after=[^"]+)"', page.get_data(as_text=True))
+            page = client.get(html.unescape(next_url.group(1)))
+            assert page.status_code == 200
+    assert len(seen) == 4
+
+
+def test_doctor_listings(app, hospital):
+    client = login(app, 'doctor0@example.com')
+    client.get('/doctor/dashboard')
+    with app.app_context():
+        patient_id = Appointment.query.filter_by(doctor_id=1).first().patient_id
+    for url, budget in [('/doctor/dashboard', 4), (f'/doctor/patient_history/{patient_id}', 3)]:
+        with query_budget(app, budget) as seen:
+            assert client.get(url).status_code == 200
+        assert seen
+
+
+def test_patient_listings(app, hospital):
+    with app.app_context():
+        email = Patient.query.join(Appointment).first().email
+    client = login(app, email)
+    client.get('/patient/dashboard')
+    for url, budget in [('/patient/dashboard', 4), ('/patient/history', 2)]:
+        with query_budget(app, budget) as seen:
+            assert client.get(url).status_code == 200
+        assert seen
+
+
+def test_streamed_export_is_counted(app, hospital):
+    client = login(app, 'admin', 'admin123')
+    with query_budget(app, 1000, endpoint='export_data') as seen:
+        with client.get('/admin/export/patients.csv') as response:
+            assert response.get_data()
+    assert seen and seen[0][1] > 0
+
+
+def test_budget_exceeded(app, hospital):
+    client = login(app, 'admin', 'admin123')
+    with pytest.raises(AssertionError, match='query budget'):
+        with query_budget(app, 0):
+            client.get('/admin/view_doctors')
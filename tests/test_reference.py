@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+from app import create_app
+from booking import book_slot
+from models import db, Department, Doctor
+from reference import get_reference
+from conftest import login
+
+
+def test_removal_reaches_other_workers(app, hospital):
+    # A second app on the same database stands in for another worker process
+    other = create_app({'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'], 'JOB_WORKERS': 0})
+    with other.app_context():
+        dept_id = db.session.get(Doctor, 1).specialization_id
+        assert 1 in dict(get_reference().doctors(dept_id))
+
+    assert login(app, 'admin', 'admin123').post('/admin/remove/doctor/1').status_code == 302
+
+    with other.app_context():
+        assert 1 not in dict(get_reference().doctors(dept_id))
+        when = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=7)
+        assert book_slot(1, 1, when) is None
+
+
+def test_new_department_reaches_other_workers(app):
+    other = create_app({'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'], 'JOB_WORKERS': 0})
+    with app.app_context():
+        assert 'Radiology' not in dict(get_reference().departments()).values()
+    with other.app_context():
+        db.session.add(Department(name='Radiology'))
+        db.session.commit()
+    with app.app_context():
+        assert 'Radiology' in dict(get_reference().departments()).values()
@@ -0,0 +1,38 @@
+from datetime import date, datetime, timedelta
+
+from archive import archive_appointments
+from booking import book_slot
+from models import db, Appointment, DailyAppointmentStats
+from reports import rebuild_rollups, occupancy, rates
+
+
+def _rollups():
+    return sorted((r.day, r.doctor_id, r.total, r.completed, r.cancelled, r.booked)
+                  for r in DailyAppointmentStats.query if r.total)
+
+
+def test_incremental_rollups_match_a_rebuild(app, hospital):
+    with app.app_context():
+        archive_appointments(older_than_days=90)
+        book_slot(1, 1, datetime.now().replace(second=0, microsecond=0) + timedelta(days=5, minutes=7))
+        Appointment.query.filter_by(status='Booked').first().status = 'Cancelled'
+        db.session.delete(Appointment.query.filter_by(status='Completed').first())
+        db.session.commit()
+        incremental = _rollups()
+        rebuild_rollups()
+        assert incremental == _rollups()
+
+
+def test_report_endpoints(app, hospital):
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin', 'password': 'admin123'})
+    response = client.get('/api/reports/rates?group=department')
+    assert response.status_code == 200 and response.json['rows']
+    assert client.get('/api/reports/occupancy?start=2024-02-01&end=2024-01-01').status_code == 400
+    assert client.get('/api/reports/nothing').status_code == 404
+    with app.app_context():
+        end = date.today()
+        rows = occupancy(end - timedelta(days=29), end)
+        assert all(0 <= row['booked'] for row in rows)
+        assert all(row['cancellation_rate'] is None or 0 <= row['cancellation_rate'] <= 1
+                   for row in rates(end - timedelta(days=29), end))